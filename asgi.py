@@ -0,0 +1,340 @@
+"""Modo de execução ASGI (FastAPI + SQLAlchemy assíncrono).
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --workers 2
+
+Atendidas por handlers assíncronos sobre um engine asyncpg, com os mesmos caminhos,
+payloads, cache, cabeçalhos (ETag/304, cursor) e métricas da aplicação Flask:
+rastreamento, histórico, listagem de entregas (GET /api/entregas), consulta de
+usuários e autenticação (/auth/login, /auth/register, /auth/status, /auth/logout).
+
+As escritas de entregas e usuários e os relatórios continuam sendo a aplicação Flask
+de main.py montada via WSGI (no pool de threads do servidor ASGI, então um relatório
+lento não bloqueia o loop de eventos): dependem dos serviços síncronos sobre o
+db.session do Flask-SQLAlchemy (unidade de trabalho, consolidação, NOTIFY dos eventos,
+expiração de tarefas) e serão portados em uma etapa própria, junto com esses serviços.
+"""
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+from urllib.parse import urlencode
+from fastapi import FastAPI, Request # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
+from fastapi.middleware.wsgi import WSGIMiddleware # type: ignore
+from fastapi.responses import JSONResponse, Response # type: ignore
+from sqlalchemy import select # type: ignore
+from sqlalchemy.engine import make_url # type: ignore
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine # type: ignore
+from sqlalchemy.orm import joinedload # type: ignore
+from werkzeug.datastructures import MultiDict # type: ignore
+from werkzeug.http import http_date, is_resource_modified, quote_etag # type: ignore
+from main import app as flask_app
+from models.models import Entrega, Usuario
+from routes.entregas import rastreamento_dict, atualizacao_dict, listar_entregas
+from services import cache_rastreamento, banco, perfil, autenticacao, metricas, senhas
+
+
+def url_assincrona(url):
+    # Mesmo DATABASE_URL da aplicação Flask, com o driver assíncrono correspondente
+    url = make_url(url.replace('postgres://', 'postgresql://', 1))
+    if url.get_backend_name() == 'sqlite':
+        return url.set(drivername='sqlite+aiosqlite')
+    query = dict(url.query)
+    # asyncpg usa "ssl" no lugar do "sslmode" do libpq
+    if 'sslmode' in query:
+        query['ssl'] = query.pop('sslmode')
+    return url.set(drivername='postgresql+asyncpg', query=query)
+
+
+url_banco = url_assincrona(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+# Mesmas opções de pool (variáveis DB_*) da aplicação Flask, incluindo o modo PgBouncer
+engine = create_async_engine(url_banco, **banco.opcoes_engine(url_banco, assincrono=True))
+banco.instrumentar(engine.sync_engine)
+# Comandos lentos dos handlers assíncronos também vão para o log
+perfil.instrumentar(engine.sync_engine, flask_app.logger)
+Sessao = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@asynccontextmanager
+async def ciclo_de_vida(api):
+    yield
+    await engine.dispose()
+
+
+app = FastAPI(title='Expresso Itaporanga API', lifespan=ciclo_de_vida, docs_url=None, redoc_url=None, openapi_url=None)
+flask_wsgi = WSGIMiddleware(flask_app)
+
+
+@app.exception_handler(Exception)
+async def erro_interno(request, e):
+    return JSONResponse({'error': str(e)}, status_code=500)
+
+
+def corpo_json(dados):
+    # Mesma serialização do jsonify do Flask (chaves ordenadas, compacto)
+    return flask_app.json.response(dados).get_data()
+
+
+def resposta_json(dados, status_code=200):
+    return Response(corpo_json(dados), status_code=status_code, media_type='application/json')
+
+
+def resposta_condicional(request, em_cache):
+    # Mesma regra do make_conditional do Flask: If-None-Match / If-Modified-Since -> 304
+    cabecalhos = {'ETag': quote_etag(em_cache['etag']), 'Cache-Control': 'no-cache'}
+    if em_cache['modificado'] is not None:
+        cabecalhos['Last-Modified'] = http_date(em_cache['modificado'])
+    ambiente = {
+        'REQUEST_METHOD': request.method,
+        'HTTP_IF_NONE_MATCH': request.headers.get('if-none-match', ''),
+        'HTTP_IF_MODIFIED_SINCE': request.headers.get('if-modified-since', '')
+    }
+    if not is_resource_modified(ambiente, etag=em_cache['etag'], last_modified=em_cache['modificado']):
+        return Response(status_code=304, headers=cabecalhos)
+    return Response(em_cache['corpo'], media_type='application/json', headers=cabecalhos)
+
+
+def exigir_autenticacao(request, perfis=None):
+    # Mesma regra das rotas Flask (services/autenticacao.exigir): token assinado, sem consultar o banco
+    if not flask_app.config['AUTH_OBRIGATORIA']:
+        return None
+    usuario = autenticacao.principal(autenticacao.token_da_requisicao(request.headers, request.cookies))
+    if usuario is None:
+        return resposta_json({'error': 'Não autenticado'}, 401)
+    if perfis and usuario['perfil'] not in perfis:
+        return resposta_json({'error': 'Acesso negado'}, 403)
+    return None
+
+
+def medir(grupo, rota):
+    # Latência, vazão e exceções no Prometheus com o mesmo grupo (blueprint) e rota da aplicação Flask
+    def decorador(handler):
+        @wraps(handler)
+        async def medido(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                response = await handler(*args, **kwargs)
+            except Exception:
+                metricas.registrar_excecao(grupo, rota)
+                metricas.registrar_requisicao(grupo, kwargs['request'].method, rota, 500, time.perf_counter() - inicio)
+                raise
+            metricas.registrar_requisicao(grupo, kwargs['request'].method, rota, response.status_code, time.perf_counter() - inicio)
+            return response
+        return medido
+    return decorador
+
+
+# Exportação em streaming e busca: rotas da aplicação Flask com o mesmo prefixo do rastreamento
+app.router.add_route('/api/entregas/exportar', flask_wsgi)
+app.router.add_route('/api/entregas/busca', flask_wsgi)
+
+
+@app.get('/api/entregas')
+@medir('entregas', '/api/entregas')
+async def get_entregas(request: Request):
+    negado = exigir_autenticacao(request)
+    if negado:
+        return negado
+    args = MultiDict(request.query_params.multi_items())
+    async with Sessao() as sessao:
+        # Mesma montagem de consulta da rota Flask, executada pela sessão assíncrona
+        try:
+            entregas, proximo_cursor, total_estimado = await sessao.run_sync(listar_entregas, args)
+        except ValueError as e:
+            return resposta_json({'error': str(e)}, 400)
+    response = resposta_json(entregas)
+    if proximo_cursor:
+        response.headers['X-Proximo-Cursor'] = proximo_cursor
+        parametros = args.to_dict()
+        parametros['cursor'] = proximo_cursor
+        response.headers['Link'] = f'</api/entregas?{urlencode(parametros)}>; rel="next"'
+    if total_estimado is not None:
+        response.headers['X-Total-Estimado'] = str(total_estimado)
+    return response
+
+
+@app.get('/api/entregas/{codigo_rastreio}')
+@medir('entregas', '/api/entregas/<codigo_rastreio>')
+async def get_entrega(codigo_rastreio: str, request: Request):
+    em_cache = cache_rastreamento.obter(codigo_rastreio)
+    if em_cache is None:
+        async with Sessao() as sessao:
+            entrega = (await sessao.scalars(
+                select(Entrega).options(
+                    joinedload(Entrega.atualizacoes),
+                    joinedload(Entrega.motorista)
+                ).where(Entrega.codigo_rastreio == codigo_rastreio)
+            )).unique().first()
+            if entrega is None:
+                return resposta_json({'error': 'Entrega não encontrada'}, 404)
+            em_cache = cache_rastreamento.guardar(codigo_rastreio, corpo_json(rastreamento_dict(entrega)), entrega)
+    return resposta_condicional(request, em_cache)
+
+
+@app.get('/api/entregas/{entrega_id}/historico')
+@medir('app', '/api/entregas/<entrega_id>/historico')
+async def get_entrega_historico(entrega_id: str, request: Request):
+    negado = exigir_autenticacao(request)
+    if negado:
+        return negado
+    if not entrega_id.isdigit():
+        return resposta_json({'error': 'Entrega não encontrada'}, 404)
+    async with Sessao() as sessao:
+        entrega = (await sessao.scalars(
+            select(Entrega).options(joinedload(Entrega.atualizacoes)).where(Entrega.id == int(entrega_id))
+        )).unique().first()
+        if entrega is None:
+            return resposta_json({'error': 'Entrega não encontrada'}, 404)
+        return resposta_json([atualizacao_dict(item) for item in reversed(entrega.atualizacoes)])
+
+
+def usuario_dict(u):
+    return {
+        'id': u.id,
+        'username': u.username,
+        'perfil': u.perfil
+    }
+
+
+@app.get('/api/usuarios')
+@medir('user', '/api/usuarios')
+async def get_usuarios(request: Request):
+    negado = exigir_autenticacao(request)
+    if negado:
+        return negado
+    async with Sessao() as sessao:
+        usuarios = (await sessao.scalars(select(Usuario))).all()
+        return resposta_json([usuario_dict(u) for u in usuarios])
+
+
+@app.get('/api/usuarios/{id}')
+@medir('user', '/api/usuarios/<int:id>')
+async def get_usuario(id: int, request: Request):
+    negado = exigir_autenticacao(request)
+    if negado:
+        return negado
+    async with Sessao() as sessao:
+        usuario = await sessao.get(Usuario, id)
+        if usuario is None:
+            return resposta_json({'error': 'Usuário não encontrado'}, 404)
+        return resposta_json(usuario_dict(usuario))
+
+
+async def corpo_da_requisicao(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+@app.post('/auth/register')
+@medir('auth', '/auth/register')
+async def register(request: Request):
+    # Cadastro só por um admin autenticado (o primeiro admin vem de `flask criar-admin`)
+    negado = exigir_autenticacao(request, ('admin',))
+    if negado:
+        return negado
+
+    data = await corpo_da_requisicao(request)
+    if not isinstance(data, dict) or not all(k in data for k in ('username', 'password')):
+        return resposta_json({'error': 'Dados incompletos'}, 400)
+    perfil = data.get('perfil') or 'usuario'
+
+    async with Sessao() as sessao:
+        if (await sessao.scalars(select(Usuario).where(Usuario.username == data['username']))).first():
+            return resposta_json({'error': 'Nome de usuário já existe'}, 400)
+        # Hash no pool limitado de services/senhas, fora do loop de eventos
+        password_hash = await run_in_threadpool(senhas.gerar_hash, data['password'])
+        sessao.add(Usuario(username=data['username'], password_hash=password_hash, perfil=perfil))
+        await sessao.commit()
+    autenticacao.desmarcar_inexistente(data['username'])
+    return resposta_json({'message': 'Usuário registrado com sucesso'}, 201)
+
+
+async def login(request):
+    data = await corpo_da_requisicao(request)
+    if not isinstance(data, dict) or not all(k in data for k in ('username', 'password')):
+        return resposta_json({'error': 'Dados incompletos'}, 400)
+
+    async with Sessao() as sessao:
+        # Nomes inexistentes vistos há pouco não consultam o banco
+        user = None
+        if not autenticacao.usuario_inexistente(data['username']):
+            user = (await sessao.scalars(select(Usuario).where(Usuario.username == data['username']))).first()
+
+        # Usuário inexistente: mesma demora de uma senha errada, mas sem calcular hash
+        if not user:
+            autenticacao.marcar_inexistente(data['username'])
+            await run_in_threadpool(senhas.simular_verificacao)
+            metricas.registrar_login(False)
+            return resposta_json({'error': 'Credenciais inválidas'}, 401)
+
+        if not await run_in_threadpool(senhas.verificar, user.password_hash, data['password']):
+            metricas.registrar_login(False)
+            return resposta_json({'error': 'Credenciais inválidas'}, 401)
+
+        metricas.registrar_login(True)
+
+        # Hash gravado com método/custo antigo: refaz com o atual (SENHA_METODO)
+        if senhas.precisa_rehash(user.password_hash):
+            try:
+                user.password_hash = await run_in_threadpool(senhas.gerar_hash, data['password'])
+                await sessao.commit()
+            except Exception as e:
+                await sessao.rollback()
+                flask_app.logger.error(f'Erro ao atualizar o hash da senha: {str(e)}')
+
+    token = autenticacao.emitir(user.id, user.username, user.perfil)
+    response = resposta_json({
+        'message': 'Login bem-sucedido',
+        'token': token,
+        'expira_em': autenticacao.VALIDADE,
+        'user': usuario_dict(user)
+    })
+    response.set_cookie(autenticacao.COOKIE, token, max_age=autenticacao.VALIDADE, httponly=True,
+                        samesite='lax', secure=request.url.scheme == 'https')
+    return response
+
+
+@app.post('/auth/login')
+@medir('auth', '/auth/login')
+async def post_login(request: Request):
+    return await login(request)
+
+
+@app.post('/auth/auth/login')
+@medir('auth', '/auth/auth/login')
+async def post_login_alternativo(request: Request):
+    return await login(request)
+
+
+@app.get('/auth/status')
+@medir('auth', '/auth/status')
+async def status(request: Request):
+    # Usuário do token, sem consultar o banco
+    usuario = autenticacao.principal(autenticacao.token_da_requisicao(request.headers, request.cookies))
+    if usuario is None:
+        return resposta_json({'logged_in': False}, 401)
+    return resposta_json({
+        'logged_in': True,
+        'user': {
+            'id': usuario['id'],
+            'username': usuario['username'],
+            'perfil': usuario['perfil']
+        }
+    })
+
+
+@app.post('/auth/logout')
+@medir('auth', '/auth/logout')
+async def logout(request: Request):
+    # Revoga o token atual (até expirar) e remove o cookie
+    usuario = autenticacao.principal(autenticacao.token_da_requisicao(request.headers, request.cookies))
+    if usuario is not None:
+        autenticacao.revogar(usuario)
+    response = resposta_json({'message': 'Logout realizado com sucesso'})
+    response.delete_cookie(autenticacao.COOKIE)
+    return response
+
+
+# Demais rotas: aplicação Flask (mesmos caminhos e payloads), no pool de threads
+app.mount('/', flask_wsgi)
@@ -0,0 +1,66 @@
+"""Benchmark do custo de autenticação por requisição.
+
+Compara a validação do token assinado (services/autenticacao) com e sem o cache
+de tokens validados e com a alternativa ingênua de carregar o Usuario do banco a
+cada requisição. Mede também uma requisição completa em /auth/status, que só
+valida o token. Usa o banco de DATABASE_URL (apenas leitura do primeiro usuário).
+
+    SECRET_KEY=... DATABASE_URL=postgresql://... python -m benchmarks.autenticacao --n 5000
+"""
+import argparse
+import statistics
+import time
+from main import app
+from models.models import db, Usuario
+from services import autenticacao
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+def _medir(n, operacao):
+    tempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        operacao()
+        tempos.append((time.perf_counter() - inicio) * 1_000_000)
+    return {'media_us': statistics.mean(tempos), 'p50_us': _percentil(tempos, 0.5), 'p95_us': _percentil(tempos, 0.95)}
+
+
+def medir(n):
+    with app.app_context():
+        db.create_all()
+        usuario = Usuario.query.first()
+        id_usuario = usuario.id if usuario else 0
+    token = autenticacao.emitir(id_usuario, 'benchmark', 'admin')
+    cliente = app.test_client()
+
+    def sem_cache():
+        autenticacao._validados.limpar()
+        autenticacao.principal(token)
+
+    def consulta_banco():
+        # Alternativa sem token: identificar o usuário com uma consulta por requisição
+        with app.app_context():
+            db.session.get(Usuario, id_usuario)
+
+    autenticacao.principal(token)
+    resultados = {
+        'token (cache)': _medir(n, lambda: autenticacao.principal(token)),
+        'token (sem cache)': _medir(n, sem_cache),
+        'Usuario do banco': _medir(n, consulta_banco),
+        'GET /auth/status': _medir(n, lambda: cliente.get('/auth/status', headers={'Authorization': f'Bearer {token}'})),
+    }
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=5000, help='repetições de cada medição')
+    argumentos = parser.parse_args()
+
+    print(f"{'validação':<20} {'média':>10} {'p50':>10} {'p95':>10}")
+    for nome, r in medir(argumentos.n).items():
+        print(f"{nome:<20} {r['media_us']:>8.1f}us {r['p50_us']:>8.1f}us {r['p95_us']:>8.1f}us")
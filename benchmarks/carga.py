@@ -0,0 +1,141 @@
+"""Benchmark de carga: aplicação Flask (gunicorn) x modo ASGI (uvicorn).
+
+Sobe os dois servidores contra o banco de DATABASE_URL, dispara consultas de
+rastreamento concorrentes (GET /api/entregas/<codigo>) em cada um e compara
+vazão e latência. O Flask (gunicorn) é a linha de base: ao final, a variação
+do modo ASGI em relação a ele. Requer httpx. Com --sem-cache o cache de
+rastreamento é desligado nos servidores, para medir o caminho até o banco.
+No SQLite o modo ASGI usa o driver aiosqlite.
+
+    SECRET_KEY=... DATABASE_URL=postgresql://... python -m benchmarks.carga --concorrencia 200 --duracao 20
+"""
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import httpx # type: ignore
+from main import app
+from models.models import Entrega
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+def _codigos(maximo=1000):
+    with app.app_context():
+        return [c for c, in Entrega.query.with_entities(Entrega.codigo_rastreio).limit(maximo)]
+
+
+def _subir(comando, porta, ambiente):
+    processo = subprocess.Popen(comando, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    limite = time.monotonic() + 30
+    while time.monotonic() < limite:
+        try:
+            httpx.get(f'http://127.0.0.1:{porta}/api/usuarios', timeout=1)
+            return processo
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError(f'Servidor não respondeu: {" ".join(comando)}')
+
+
+async def _carga(url_base, codigos, concorrencia, duracao):
+    latencias = []
+    erros = 0
+    fim = time.monotonic() + duracao
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+
+    async with httpx.AsyncClient(base_url=url_base, limits=limites, timeout=30) as cliente:
+        async def usuario():
+            nonlocal erros
+            while time.monotonic() < fim:
+                inicio = time.perf_counter()
+                try:
+                    resposta = await cliente.get(f'/api/entregas/{random.choice(codigos)}')
+                    if resposta.status_code != 200:
+                        erros += 1
+                        continue
+                except httpx.HTTPError:
+                    erros += 1
+                    continue
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        await asyncio.gather(*(usuario() for _ in range(concorrencia)))
+
+    return {
+        'req_s': len(latencias) / duracao,
+        'p50_ms': _percentil(latencias, 0.5) if latencias else 0,
+        'p95_ms': _percentil(latencias, 0.95) if latencias else 0,
+        'p99_ms': _percentil(latencias, 0.99) if latencias else 0,
+        'erros': erros,
+    }
+
+
+def medir(concorrencia, duracao, workers, sem_cache):
+    codigos = _codigos()
+    if not codigos:
+        raise RuntimeError('Nenhuma entrega no banco para consultar')
+
+    ambiente = dict(os.environ)
+    if sem_cache:
+        ambiente['RASTREIO_CACHE_MAX'] = '0'
+
+    servidores = {
+        'flask (gunicorn gthread)': lambda porta: [
+            sys.executable, '-m', 'gunicorn', 'main:app', '--bind', f'127.0.0.1:{porta}',
+            '--workers', str(workers), '--worker-class', 'gthread', '--threads', '32'
+        ],
+        'asgi (uvicorn)': lambda porta: [
+            sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(porta),
+            '--workers', str(workers), '--no-access-log'
+        ],
+    }
+
+    resultados = {}
+    for nome, comando in servidores.items():
+        porta = _porta_livre()
+        processo = _subir(comando(porta), porta, ambiente)
+        try:
+            url_base = f'http://127.0.0.1:{porta}'
+            asyncio.run(_carga(url_base, codigos, min(concorrencia, 20), 2))  # aquecimento
+            resultados[nome] = asyncio.run(_carga(url_base, codigos, concorrencia, duracao))
+        finally:
+            processo.terminate()
+            processo.wait()
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concorrencia', type=int, default=200, help='clientes simultâneos')
+    parser.add_argument('--duracao', type=int, default=20, help='segundos de carga por servidor')
+    parser.add_argument('--workers', type=int, default=2, help='processos de cada servidor')
+    parser.add_argument('--sem-cache', action='store_true', help='desliga o cache de rastreamento')
+    argumentos = parser.parse_args()
+
+    resultados = medir(argumentos.concorrencia, argumentos.duracao, argumentos.workers, argumentos.sem_cache)
+    print(f"{'servidor':<26} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'erros':>6}")
+    for nome, r in resultados.items():
+        print(f"{nome:<26} {r['req_s']:>9.1f} {r['p50_ms']:>7.1f}ms {r['p95_ms']:>7.1f}ms "
+              f"{r['p99_ms']:>7.1f}ms {r['erros']:>6}")
+
+    # Antes (Flask) x depois (ASGI)
+    base, asgi = resultados['flask (gunicorn gthread)'], resultados['asgi (uvicorn)']
+
+    def variacao(campo):
+        return (asgi[campo] / base[campo] - 1) * 100 if base[campo] else 0
+
+    print(f"{'asgi x flask':<26} {variacao('req_s'):>+8.1f}% {variacao('p50_ms'):>+8.1f}% "
+          f"{variacao('p95_ms'):>+8.1f}% {variacao('p99_ms'):>+8.1f}%")
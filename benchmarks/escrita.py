@@ -0,0 +1,93 @@
+"""Benchmark do caminho de escrita (criação, atualização e status de entregas).
+
+Executa as rotas de escrita pelo cliente de testes do Flask contra o banco de
+DATABASE_URL e mede latência, commits e comandos SQL por requisição. Use um
+banco descartável: as entregas criadas são removidas no final.
+
+    SECRET_KEY=... DATABASE_URL=postgresql://... python -m benchmarks.escrita --n 200
+"""
+import argparse
+import statistics
+import time
+import uuid
+from sqlalchemy import event # type: ignore
+from main import app
+from models.models import db, Entrega
+from services import autenticacao
+
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p * (len(ordenados) - 1))))]
+
+
+def medir(n):
+    cliente = app.test_client()
+    # As rotas de escrita exigem token; o benchmark usa um token de admin emitido direto
+    cliente.environ_base['HTTP_AUTHORIZATION'] = f"Bearer {autenticacao.emitir(0, 'benchmark', 'admin')}"
+    prefixo = f'BENCH{uuid.uuid4().hex[:8].upper()}'
+    contadores = {'commits': 0, 'comandos': 0}
+
+    with app.app_context():
+        db.create_all()
+        motor = db.engine
+
+    def contar_commit(conexao):
+        contadores['commits'] += 1
+
+    def contar_comando(*args):
+        contadores['comandos'] += 1
+
+    event.listen(motor, 'commit', contar_commit)
+    event.listen(motor, 'before_cursor_execute', contar_comando)
+
+    operacoes = {
+        'POST /api/entregas': lambda i: cliente.post('/api/entregas', json={
+            'codigo_rastreio': f'{prefixo}{i:06d}', 'remetente': 'Benchmark', 'destinatario': 'Benchmark',
+            'origem': 'Itaporanga, PB', 'destino': 'Patos, PB'
+        }),
+        'PUT /api/entregas/<codigo>': lambda i: cliente.put(f'/api/entregas/{prefixo}{i:06d}', json={
+            'status': 'Em trânsito', 'observacoes': 'Saiu do centro de distribuição'
+        }),
+        'POST /api/entregas/<codigo>/status': lambda i: cliente.post(f'/api/entregas/{prefixo}{i:06d}/status', json={
+            'status': 'Entregue'
+        }),
+    }
+
+    resultados = {}
+    try:
+        for nome, operacao in operacoes.items():
+            contadores.update(commits=0, comandos=0)
+            tempos = []
+            for i in range(n):
+                inicio = time.perf_counter()
+                resposta = operacao(i)
+                tempos.append((time.perf_counter() - inicio) * 1000)
+                if resposta.status_code >= 400:
+                    raise RuntimeError(f'{nome}: {resposta.status_code} {resposta.get_json()}')
+            resultados[nome] = {
+                'media_ms': statistics.mean(tempos),
+                'p50_ms': _percentil(tempos, 0.5),
+                'p95_ms': _percentil(tempos, 0.95),
+                'commits': contadores['commits'] / n,
+                'comandos': contadores['comandos'] / n,
+            }
+    finally:
+        event.remove(motor, 'commit', contar_commit)
+        event.remove(motor, 'before_cursor_execute', contar_comando)
+        with app.app_context():
+            for entrega in Entrega.query.filter(Entrega.codigo_rastreio.like(f'{prefixo}%')):
+                db.session.delete(entrega)
+            db.session.commit()
+    return resultados
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--n', type=int, default=200, help='requisições por rota')
+    argumentos = parser.parse_args()
+
+    print(f"{'rota':<36} {'média':>8} {'p50':>8} {'p95':>8} {'commits':>8} {'comandos':>9}")
+    for nome, r in medir(argumentos.n).items():
+        print(f"{nome:<36} {r['media_ms']:>6.2f}ms {r['p50_ms']:>6.2f}ms {r['p95_ms']:>6.2f}ms "
+              f"{r['commits']:>8.1f} {r['comandos']:>9.1f}")
@@ -0,0 +1,21 @@
+import os
+import shutil
+import tempfile
+
+# Lido pelo gunicorn na inicialização (antes de criar os workers).
+# Métricas do Prometheus compartilhadas entre os workers: cada processo grava seus valores
+# em PROMETHEUS_MULTIPROC_DIR e o GET /metrics de qualquer worker soma os de todos.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'prometheus_expresso'))
+
+
+def on_starting(server):
+    # Descarta métricas de execuções anteriores
+    diretorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(diretorio, ignore_errors=True)
+    os.makedirs(diretorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Worker encerrado: seus gauges deixam de contar (contadores e histogramas são mantidos)
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,71 @@
+"""tabelas iniciais (usuarios, entregas, atualizacoes_status)
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-17 12:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Bancos já em produção têm estas tabelas: só cria o que faltar
+    inspector = sa.inspect(op.get_bind())
+
+    if not inspector.has_table('usuarios'):
+        op.create_table('usuarios',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(length=80), nullable=False),
+            sa.Column('password_hash', sa.String(length=128), nullable=False),
+            sa.Column('perfil', sa.String(length=20), nullable=True),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('username')
+        )
+
+    if not inspector.has_table('entregas'):
+        op.create_table('entregas',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('codigo_rastreio', sa.String(length=20), nullable=False),
+            sa.Column('remetente', sa.String(length=100), nullable=False),
+            sa.Column('destinatario', sa.String(length=100), nullable=False),
+            sa.Column('origem', sa.String(length=100), nullable=False),
+            sa.Column('destino', sa.String(length=100), nullable=False),
+            sa.Column('status', sa.String(length=30), nullable=False),
+            sa.Column('data_criacao', sa.DateTime(), nullable=False),
+            sa.Column('data_atualizacao', sa.DateTime(), nullable=False),
+            sa.Column('data_prevista_entrega', sa.DateTime(), nullable=True),
+            sa.Column('motivo_atraso', sa.String(length=200), nullable=True),
+            sa.Column('motivo_devolucao', sa.String(length=200), nullable=True),
+            sa.Column('km', sa.Float(), nullable=True),
+            sa.Column('peso', sa.Float(), nullable=True),
+            sa.Column('preco', sa.Float(), nullable=True),
+            sa.Column('motorista_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['motorista_id'], ['usuarios.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('codigo_rastreio')
+        )
+
+    if not inspector.has_table('atualizacoes_status'):
+        op.create_table('atualizacoes_status',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('entrega_id', sa.Integer(), nullable=False),
+            sa.Column('status', sa.String(length=30), nullable=False),
+            sa.Column('timestamp', sa.DateTime(), nullable=False),
+            sa.Column('observacoes', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['entrega_id'], ['entregas.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+
+def downgrade():
+    op.drop_table('atualizacoes_status')
+    op.drop_table('entregas')
+    op.drop_table('usuarios')
@@ -0,0 +1,59 @@
+"""consolidação diária de KPIs e fila de tarefas de relatório
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 12:05:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('kpis_diarios',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('dia', sa.Date(), nullable=False),
+        sa.Column('status', sa.String(length=30), nullable=False),
+        sa.Column('motorista_id', sa.Integer(), nullable=True),
+        sa.Column('regiao', sa.String(length=100), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('no_prazo', sa.Integer(), nullable=False),
+        sa.Column('atrasadas', sa.Integer(), nullable=False),
+        sa.Column('km', sa.Float(), nullable=True),
+        sa.Column('peso', sa.Float(), nullable=True),
+        sa.Column('preco', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_kpis_diarios_dia', 'kpis_diarios', ['dia'], unique=False)
+
+    op.create_table('tarefas_relatorio',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('tipo', sa.String(length=20), nullable=False),
+        sa.Column('chave', sa.String(length=120), nullable=False),
+        sa.Column('data_inicio', sa.DateTime(), nullable=False),
+        sa.Column('data_fim', sa.DateTime(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('erro', sa.Text(), nullable=True),
+        sa.Column('criado_em', sa.DateTime(), nullable=False),
+        sa.Column('iniciado_em', sa.DateTime(), nullable=True),
+        sa.Column('concluido_em', sa.DateTime(), nullable=True),
+        sa.Column('resultado', sa.LargeBinary(), nullable=True),
+        sa.Column('mimetype', sa.String(length=100), nullable=True),
+        sa.Column('nome_arquivo', sa.String(length=120), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_tarefas_relatorio_chave', 'tarefas_relatorio', ['chave'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_tarefas_relatorio_chave', table_name='tarefas_relatorio')
+    op.drop_table('tarefas_relatorio')
+    op.drop_index('ix_kpis_diarios_dia', table_name='kpis_diarios')
+    op.drop_table('kpis_diarios')
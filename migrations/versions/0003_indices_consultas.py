@@ -0,0 +1,38 @@
+"""índices compostos para as consultas mais frequentes
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 12:10:00
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY no Postgres: não bloqueia escritas em tabelas grandes
+    with op.get_context().autocommit_block():
+        # Relatórios (intervalo de data_criacao) e listagem paginada por (data_criacao, id)
+        op.create_index('ix_entregas_data_criacao_id', 'entregas', ['data_criacao', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_entregas_status_data_criacao', 'entregas', ['status', 'data_criacao'],
+                        unique=False, postgresql_concurrently=True)
+        # Ranking de motoristas
+        op.create_index('ix_entregas_motorista_data_criacao', 'entregas', ['motorista_id', 'data_criacao'],
+                        unique=False, postgresql_concurrently=True)
+        # Histórico de status por entrega em ordem cronológica
+        op.create_index('ix_atualizacoes_status_entrega_timestamp', 'atualizacoes_status', ['entrega_id', 'timestamp'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_atualizacoes_status_entrega_timestamp', table_name='atualizacoes_status')
+    op.drop_index('ix_entregas_motorista_data_criacao', table_name='entregas')
+    op.drop_index('ix_entregas_status_data_criacao', table_name='entregas')
+    op.drop_index('ix_entregas_data_criacao_id', table_name='entregas')
@@ -0,0 +1,33 @@
+"""localização e motivos no histórico de status
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 12:15:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+COLUNAS = ('localizacao', 'motivo_atraso', 'motivo_devolucao')
+
+
+def upgrade():
+    # O histórico (GET /api/entregas/<id>/historico) já lia estas colunas; só cria as que faltarem
+    existentes = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('atualizacoes_status')}
+    with op.batch_alter_table('atualizacoes_status') as batch_op:
+        for coluna in COLUNAS:
+            if coluna not in existentes:
+                batch_op.add_column(sa.Column(coluna, sa.String(length=200), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('atualizacoes_status') as batch_op:
+        for coluna in reversed(COLUNAS):
+            batch_op.drop_column(coluna)
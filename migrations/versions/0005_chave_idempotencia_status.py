@@ -0,0 +1,31 @@
+"""chave de idempotência dos eventos de status
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 12:20:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('atualizacoes_status', sa.Column('chave_idempotencia', sa.String(length=100), nullable=True))
+    # Índice único: um reenvio do mesmo evento (leitor de código de barras) não duplica o histórico.
+    # Linhas antigas ficam com NULL, que não conflita.
+    with op.get_context().autocommit_block():
+        op.create_index('ix_atualizacoes_status_chave_idempotencia', 'atualizacoes_status', ['chave_idempotencia'],
+                        unique=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_atualizacoes_status_chave_idempotencia', table_name='atualizacoes_status')
+    with op.batch_alter_table('atualizacoes_status') as batch_op:
+        batch_op.drop_column('chave_idempotencia')
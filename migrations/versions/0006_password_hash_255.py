@@ -0,0 +1,29 @@
+"""password_hash com espaço para hashes scrypt
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 17:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # scrypt (SENHA_METODO=scrypt:...) gera hashes de ~160 caracteres
+    with op.batch_alter_table('usuarios') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=128),
+                              type_=sa.String(length=255), existing_nullable=False)
+
+
+def downgrade():
+    with op.batch_alter_table('usuarios') as batch_op:
+        batch_op.alter_column('password_hash', existing_type=sa.String(length=255),
+                              type_=sa.String(length=128), existing_nullable=False)
@@ -0,0 +1,68 @@
+"""coluna e índice de trigramas para a busca de entregas
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 17:30:00
+
+"""
+import unicodedata
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+BLOCO = 5000
+
+# Cópia da normalização de services/busca.py como era nesta revisão: a migração não
+# deve mudar de comportamento quando a aplicação mudar
+CAMPOS = ('codigo_rastreio', 'remetente', 'destinatario', 'origem', 'destino')
+
+
+def normalizar(texto):
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def termos(valores):
+    return ' '.join(normalizar(valores[campo]) for campo in CAMPOS if valores[campo])
+
+
+def upgrade():
+    op.add_column('entregas', sa.Column('termos_busca', sa.Text(), nullable=True))
+
+    # Preenche as entregas existentes em blocos (a normalização sem acentos é feita em Python)
+    conexao = op.get_bind()
+    entregas = sa.table('entregas', sa.column('id', sa.Integer), sa.column('termos_busca', sa.Text),
+                        *(sa.column(campo, sa.String) for campo in CAMPOS))
+    ultimo_id = 0
+    while True:
+        linhas = conexao.execute(
+            sa.select(entregas.c.id, *(entregas.c[campo] for campo in CAMPOS))
+            .where(entregas.c.id > ultimo_id).order_by(entregas.c.id).limit(BLOCO)
+        ).mappings().all()
+        if not linhas:
+            break
+        conexao.execute(
+            entregas.update().where(entregas.c.id == sa.bindparam('b_id')).values(termos_busca=sa.bindparam('b_termos')),
+            [{'b_id': linha['id'], 'b_termos': termos(dict(linha))} for linha in linhas]
+        )
+        ultimo_id = linhas[-1]['id']
+
+    if conexao.dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.get_context().autocommit_block():
+        op.create_index('ix_entregas_termos_busca_trgm', 'entregas', ['termos_busca'], unique=False,
+                        postgresql_using='gin', postgresql_ops={'termos_busca': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_entregas_termos_busca_trgm', table_name='entregas')
+    with op.batch_alter_table('entregas') as batch_op:
+        batch_op.drop_column('termos_busca')
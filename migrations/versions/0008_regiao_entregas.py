@@ -0,0 +1,58 @@
+"""coluna regiao (UF do destino) e índice de problemas por região das entregas
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 19:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+BLOCO = 5000
+
+
+def regiao_destino(destino):
+    # Cópia de models.models.regiao_destino como era nesta revisão
+    if not destino:
+        return ''
+    regiao = destino.split(',')[-1].strip() if ',' in destino else destino.strip()
+    return regiao.upper() if len(regiao) == 2 and regiao.isalpha() else regiao
+
+
+def upgrade():
+    op.add_column('entregas', sa.Column('regiao', sa.String(length=100), nullable=False, server_default=''))
+
+    # Preenche as entregas existentes em blocos
+    conexao = op.get_bind()
+    entregas = sa.table('entregas', sa.column('id', sa.Integer), sa.column('destino', sa.String),
+                        sa.column('regiao', sa.String))
+    ultimo_id = 0
+    while True:
+        linhas = conexao.execute(
+            sa.select(entregas.c.id, entregas.c.destino)
+            .where(entregas.c.id > ultimo_id).order_by(entregas.c.id).limit(BLOCO)
+        ).all()
+        if not linhas:
+            break
+        conexao.execute(
+            entregas.update().where(entregas.c.id == sa.bindparam('b_id')).values(regiao=sa.bindparam('b_regiao')),
+            [{'b_id': id, 'b_regiao': regiao_destino(destino)} for id, destino in linhas]
+        )
+        ultimo_id = linhas[-1][0]
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_entregas_data_criacao_status_regiao', 'entregas', ['data_criacao', 'status', 'regiao'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ix_entregas_data_criacao_status_regiao', table_name='entregas')
+    with op.batch_alter_table('entregas') as batch_op:
+        batch_op.drop_column('regiao')
@@ -0,0 +1,31 @@
+"""resultado das tarefas de relatório em arquivo, fora do banco
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-17 20:30:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('tarefas_relatorio', sa.Column('arquivo', sa.String(length=255), nullable=True))
+    # Resultados gravados no banco não são migrados: as tarefas prontas expiram e são geradas de novo
+    op.execute("UPDATE tarefas_relatorio SET status = 'expirada' WHERE status = 'concluida'")
+    with op.batch_alter_table('tarefas_relatorio') as batch_op:
+        batch_op.drop_column('resultado')
+
+
+def downgrade():
+    op.add_column('tarefas_relatorio', sa.Column('resultado', sa.LargeBinary(), nullable=True))
+    op.execute("UPDATE tarefas_relatorio SET status = 'expirada' WHERE status = 'concluida'")
+    with op.batch_alter_table('tarefas_relatorio') as batch_op:
+        batch_op.drop_column('arquivo')
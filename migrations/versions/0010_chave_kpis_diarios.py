@@ -0,0 +1,28 @@
+"""índice único (dia, status, motorista, região) para a consolidação incremental
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-17 21:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Alvo do INSERT ... ON CONFLICT DO UPDATE; motorista nulo conta como 0 (NULLs não conflitam)
+    with op.get_context().autocommit_block():
+        op.create_index('ux_kpis_diarios_chave', 'kpis_diarios',
+                        ['dia', 'status', sa.text('coalesce(motorista_id, 0)'), 'regiao'],
+                        unique=True, postgresql_concurrently=True)
+
+
+def downgrade():
+    op.drop_index('ux_kpis_diarios_chave', table_name='kpis_diarios')
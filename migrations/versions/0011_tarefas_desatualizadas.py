@@ -0,0 +1,27 @@
+"""tarefas de relatório desatualizadas durante a geração
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-18 10:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0011'
+down_revision = '0010'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('tarefas_relatorio', sa.Column('desatualizada', sa.Boolean(), nullable=False, server_default=sa.false()))
+    op.add_column('tarefas_relatorio', sa.Column('geracoes', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('tarefas_relatorio') as batch_op:
+        batch_op.drop_column('geracoes')
+        batch_op.drop_column('desatualizada')
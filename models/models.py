@@ -1,24 +1,37 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event # type: ignore
 from datetime import datetime
 
 db = SQLAlchemy()
 
 class Usuario(db.Model):
-    _tablename_ = 'usuarios'
+    __tablename__ = 'usuarios'
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)
     perfil = db.Column(db.String(20), default='usuario')  # 'admin', 'usuario', 'motorista'
     
     # Relacionamento com entregas (um motorista pode ter várias entregas)
     entregas = db.relationship('Entrega', backref='motorista', lazy=True, foreign_keys='Entrega.motorista_id')
     
-    def _repr_(self):
+    def __repr__(self):
         return f'<Usuario {self.username}>'
 
 class Entrega(db.Model):
-    _tablename_ = 'entregas'
+    __tablename__ = 'entregas'
+    __table_args__ = (
+        # Relatórios e listagem paginada: intervalo de data_criacao, desempate por id
+        db.Index('ix_entregas_data_criacao_id', 'data_criacao', 'id'),
+        db.Index('ix_entregas_status_data_criacao', 'status', 'data_criacao'),
+        db.Index('ix_entregas_motorista_data_criacao', 'motorista_id', 'data_criacao'),
+        # Problemas por região no período: intervalo de data_criacao, filtro de status e GROUP BY regiao
+        # atendidos só pelo índice (index-only scan)
+        db.Index('ix_entregas_data_criacao_status_regiao', 'data_criacao', 'status', 'regiao'),
+        # Busca por trechos de código, nomes e cidades (LIKE '%termo%'): trigramas no Postgres
+        db.Index('ix_entregas_termos_busca_trgm', 'termos_busca', postgresql_using='gin',
+                 postgresql_ops={'termos_busca': 'gin_trgm_ops'}),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     codigo_rastreio = db.Column(db.String(20), unique=True, nullable=False)
@@ -26,6 +39,8 @@ class Entrega(db.Model):
     destinatario = db.Column(db.String(100), nullable=False)
     origem = db.Column(db.String(100), nullable=False)
     destino = db.Column(db.String(100), nullable=False)
+    # Região (UF) do destino, derivada na gravação (regiao_destino)
+    regiao = db.Column(db.String(100), nullable=False, default='', server_default='')
     status = db.Column(db.String(30), nullable=False, default='Registrado')
     data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     data_atualizacao = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -37,22 +52,116 @@ class Entrega(db.Model):
     km = db.Column(db.Float)  # Distância em km
     peso = db.Column(db.Float)  # Peso em kg
     preco = db.Column(db.Float)  # Preço/valor da entrega
+    # Código, remetente, destinatário, origem e destino sem acentos e em minúsculas (services/busca.py)
+    termos_busca = db.Column(db.Text)
     
     # Relacionamentos
     motorista_id = db.Column(db.Integer, db.ForeignKey('usuarios.id'))
-    atualizacoes = db.relationship('AtualizacaoStatus', backref='entrega', lazy=True, cascade='all, delete-orphan')
+    atualizacoes = db.relationship('AtualizacaoStatus', backref='entrega', lazy=True, cascade='all, delete-orphan',
+                                   order_by='AtualizacaoStatus.timestamp')
     
-    def _repr_(self):
+    def __repr__(self):
         return f'<Entrega {self.codigo_rastreio}>'
 
+def regiao_destino(destino):
+    # Região de destino: último trecho do campo destino ("Cidade, UF" -> "UF"), com a UF em maiúsculas
+    if not destino:
+        return ''
+    regiao = destino.split(',')[-1].strip() if ',' in destino else destino.strip()
+    return regiao.upper() if len(regiao) == 2 and regiao.isalpha() else regiao
+
+@event.listens_for(Entrega, 'before_insert')
+@event.listens_for(Entrega, 'before_update')
+def atualizar_regiao(mapper, conexao, entrega):
+    # Mantém entregas.regiao em dia quando o ORM grava o destino; os INSERTs em lote
+    # (services/lotes) preenchem a coluna direto
+    entrega.regiao = regiao_destino(entrega.destino)
+
+# O índice de trigramas da busca requer a extensão pg_trgm
+event.listen(Entrega.__table__, 'before_create', DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
+
 class AtualizacaoStatus(db.Model):
-    _tablename_ = 'atualizacoes_status'
+    __tablename__ = 'atualizacoes_status'
+    __table_args__ = (
+        # Histórico de uma entrega em ordem cronológica
+        # (também usado para achar o último 'Entregue' de cada entrega nos relatórios)
+        db.Index('ix_atualizacoes_status_entrega_timestamp', 'entrega_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     entrega_id = db.Column(db.Integer, db.ForeignKey('entregas.id'), nullable=False)
     status = db.Column(db.String(30), nullable=False)
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     observacoes = db.Column(db.Text)
+    localizacao = db.Column(db.String(200))
+    motivo_atraso = db.Column(db.String(200))
+    motivo_devolucao = db.Column(db.String(200))
+    # Chave enviada pelo cliente em atualizações em lote; reenvios do mesmo evento são ignorados
+    chave_idempotencia = db.Column(db.String(100), unique=True, index=True)
     
-    def _repr_(self):
+    def __repr__(self):
         return f'<AtualizacaoStatus {self.id} - {self.status}>'
+
+class KpiDiario(db.Model):
+    # Consolidação diária de entregas (dia × status × motorista × região de destino)
+    __tablename__ = 'kpis_diarios'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    dia = db.Column(db.Date, nullable=False, index=True)
+    status = db.Column(db.String(30), nullable=False)
+    motorista_id = db.Column(db.Integer)
+    regiao = db.Column(db.String(100), nullable=False, default='')
+    
+    total = db.Column(db.Integer, nullable=False, default=0)
+    no_prazo = db.Column(db.Integer, nullable=False, default=0)
+    atrasadas = db.Column(db.Integer, nullable=False, default=0)
+    km = db.Column(db.Float)
+    peso = db.Column(db.Float)
+    preco = db.Column(db.Float)
+    
+    def __repr__(self):
+        return f'<KpiDiario {self.dia} - {self.status}>'
+
+# Uma linha por (dia, status, motorista, região): alvo do ON CONFLICT da consolidação incremental
+db.Index('ux_kpis_diarios_chave', KpiDiario.dia, KpiDiario.status, db.func.coalesce(KpiDiario.motorista_id, 0),
+         KpiDiario.regiao, unique=True)
+
+class TarefaRelatorio(db.Model):
+    # Geração assíncrona de relatórios (fila no próprio banco, sem broker externo)
+    __tablename__ = 'tarefas_relatorio'
+    
+    id = db.Column(db.String(36), primary_key=True)
+    tipo = db.Column(db.String(20), nullable=False)  # 'desempenho', 'qualidade', 'excel'
+    chave = db.Column(db.String(120), nullable=False, index=True)  # tipo + período normalizado
+    data_inicio = db.Column(db.DateTime, nullable=False)
+    data_fim = db.Column(db.DateTime, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # 'pendente', 'executando', 'concluida', 'expirada', 'erro'
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+    # Entregas do período alteradas durante a geração: o resultado sai desatualizado e é gerado de novo
+    desatualizada = db.Column(db.Boolean, nullable=False, default=False)
+    geracoes = db.Column(db.Integer, nullable=False, default=0)
+    
+    # Caminho do resultado em RELATORIO_DIRETORIO, enviado em partes no download
+    arquivo = db.Column(db.String(255))
+    mimetype = db.Column(db.String(100))
+    nome_arquivo = db.Column(db.String(120))
+    
+    def __repr__(self):
+        return f'<TarefaRelatorio {self.id} - {self.status}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'status': self.status,
+            'periodo': {
+                'inicio': self.data_inicio.isoformat(),
+                'fim': self.data_fim.isoformat()
+            },
+            'erro': self.erro,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None
+        }
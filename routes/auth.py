@@ -1,12 +1,17 @@
-from flask import Blueprint, request, jsonify
-from werkzeug.security import check_password_hash, generate_password_hash
+from flask import Blueprint, request, jsonify, current_app, make_response
 from models.models import db, Usuario
+from services import metricas, senhas, autenticacao
 
 # Definir o blueprint
 auth_bp = Blueprint('auth', __name__)
 
 @auth_bp.route('/register', methods=['POST'])
 def register():
+    # Cadastro só por um admin autenticado (o primeiro admin vem de `flask criar-admin`)
+    negado = autenticacao.exigir(('admin',))
+    if negado:
+        return negado
+
     data = request.get_json()
     
     # Verificar se todos os campos necessários estão presentes
@@ -17,57 +22,96 @@ def register():
     if Usuario.query.filter_by(username=data['username']).first():
         return jsonify({'error': 'Nome de usuário já existe'}), 400
     
+    perfil = data.get('perfil') or 'usuario'
+    
     # Criar novo usuário
     new_user = Usuario(
         username=data['username'],
-        password_hash=generate_password_hash(data['password']),
-        perfil=data.get('perfil', 'usuario')  # Perfil padrão é 'usuario'
+        password_hash=senhas.gerar_hash(data['password']),
+        perfil=perfil
     )
     
     db.session.add(new_user)
     db.session.commit()
+    autenticacao.desmarcar_inexistente(new_user.username)
     
     return jsonify({'message': 'Usuário registrado com sucesso'}), 201
 
+@auth_bp.route('/login', methods=['POST'])
 @auth_bp.route('/auth/login', methods=['POST'])
 def login():
-    print("Recebendo requisição de login")
     data = request.get_json()
-    print(f"Dados recebidos: {data}")
     
     # Verificar se todos os campos necessários estão presentes
     if not all(k in data for k in ('username', 'password')):
         return jsonify({'error': 'Dados incompletos'}), 400
     
-    # Buscar usuário
-    user = Usuario.query.filter_by(username=data['username']).first()
+    # Buscar usuário (nomes inexistentes vistos há pouco não consultam o banco)
+    user = None
+    if not autenticacao.usuario_inexistente(data['username']):
+        user = Usuario.query.filter_by(username=data['username']).first()
     
-    # Verificar se o usuário existe e a senha está correta
-    if not user or not check_password_hash(user.password_hash, data['password']):
+    # Usuário inexistente: mesma demora de uma senha errada, mas sem calcular hash
+    if not user:
+        autenticacao.marcar_inexistente(data['username'])
+        senhas.simular_verificacao()
+        metricas.registrar_login(False)
+        return jsonify({'error': 'Credenciais inválidas'}), 401
+
+    # Verificar se a senha está correta
+    if not senhas.verificar(user.password_hash, data['password']):
+        metricas.registrar_login(False)
         return jsonify({'error': 'Credenciais inválidas'}), 401
     
-    # Aqui você implementaria a lógica de sessão/token
-    # Por simplicidade, apenas retornamos os dados do usuário
-    return jsonify({
+    metricas.registrar_login(True)
+
+    # Hash gravado com método/custo antigo: refaz com o atual (SENHA_METODO)
+    if senhas.precisa_rehash(user.password_hash):
+        try:
+            user.password_hash = senhas.gerar_hash(data['password'])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f'Erro ao atualizar o hash da senha: {str(e)}')
+
+    # Token assinado com id, username e perfil: as rotas protegidas o validam sem consultar o banco.
+    # Vai no corpo (Authorization: Bearer) e em cookie HttpOnly (páginas servidas pelo próprio app).
+    token = autenticacao.emitir(user.id, user.username, user.perfil)
+    response = make_response(jsonify({
         'message': 'Login bem-sucedido',
+        'token': token,
+        'expira_em': autenticacao.VALIDADE,
         'user': {
             'id': user.id,
             'username': user.username,
             'perfil': user.perfil
         }
-    }), 200
+    }), 200)
+    response.set_cookie(autenticacao.COOKIE, token, max_age=autenticacao.VALIDADE, httponly=True,
+                        samesite='Lax', secure=request.is_secure)
+    return response
 
 @auth_bp.route('/status', methods=['GET'])
 def status():
-    # Simulação de verificação de autenticação
-    # Em uma implementação real, você verificaria o token/sessão
-    
-    # Simulando um usuário autenticado
+    # Usuário do token, sem consultar o banco
+    usuario = autenticacao.principal(autenticacao.token_da_requisicao(request.headers, request.cookies))
+    if usuario is None:
+        return jsonify({'logged_in': False}), 401
     return jsonify({
         'logged_in': True,
         'user': {
-            'id': 1,
-            'username': 'admin',
-            'perfil': 'admin'
+            'id': usuario['id'],
+            'username': usuario['username'],
+            'perfil': usuario['perfil']
         }
     }), 200
+
+@auth_bp.route('/logout', methods=['POST'])
+def logout():
+    # Revoga o token atual (até expirar) e remove o cookie
+    usuario = autenticacao.principal(autenticacao.token_da_requisicao(request.headers, request.cookies))
+    if usuario is not None:
+        autenticacao.revogar(usuario)
+    response = make_response(jsonify({'message': 'Logout realizado com sucesso'}), 200)
+    response.delete_cookie(autenticacao.COOKIE)
+    return response
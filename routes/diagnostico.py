@@ -0,0 +1,29 @@
+from flask import Blueprint, jsonify
+from models.models import db
+from services import banco, perfil, autenticacao
+
+# Definir o blueprint
+diagnostico_bp = Blueprint('diagnostico', __name__)
+
+@diagnostico_bp.before_request
+def exigir_autenticacao():
+    # Estado interno do pool e das consultas: só para admin
+    return autenticacao.exigir(('admin',))
+
+@diagnostico_bp.route('/diagnostico/pool', methods=['GET'])
+def get_pool():
+    try:
+        # Estado do pool deste worker: conexões em uso/livres, overflow, checkouts, esperas e timeouts
+        return jsonify(banco.status_pool(db.engine)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@diagnostico_bp.route('/diagnostico/consultas', methods=['GET'])
+def get_consultas():
+    try:
+        # Histograma de consultas e tempo de banco por endpoint deste worker (PERFIL_HISTOGRAMA=1)
+        if not perfil.HISTOGRAMA:
+            return jsonify({'error': 'Histograma desativado (PERFIL_HISTOGRAMA=1)'}), 404
+        return jsonify(perfil.histograma.to_dict()), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,89 +1,283 @@
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, request, jsonify, current_app, url_for, Response, stream_with_context
+from sqlalchemy import select, tuple_ # type: ignore
+from sqlalchemy.exc import IntegrityError # type: ignore
+from sqlalchemy.orm import joinedload # type: ignore
 from models.models import db, Entrega, AtualizacaoStatus, Usuario
+from services import consolidacao, paginacao, cache_relatorios, cache_rastreamento, lotes, eventos, metricas, autenticacao, busca, tarefas, perfil
+from services.transacao import transacional, apos_commit
 from datetime import datetime
 
 # Definir o blueprint
 entregas_bp = Blueprint('entregas', __name__)
 
+# Perfis que alteram entregas e extraem a base inteira (exportação e busca)
+PERFIS_OPERACAO = ('admin', 'operador')
+ROTAS_OPERACAO = ('entregas.exportar_entregas', 'entregas.buscar_entregas')
+
+@entregas_bp.before_request
+def exigir_autenticacao():
+    # O rastreamento por código é público; a listagem exige token; escrita, lotes,
+    # exportação e busca só para admin/operador
+    if request.endpoint == 'entregas.get_entrega':
+        return None
+    if request.method != 'GET' or request.endpoint in ROTAS_OPERACAO:
+        return autenticacao.exigir(PERFIS_OPERACAO)
+    return autenticacao.exigir()
+
+# Mantém a consolidação diária de KPIs em dia, na mesma transação da escrita:
+# o estado anterior das entregas alteradas sai (antes da alteração) e o novo entra (depois do flush)
+def retirar_da_consolidacao(*ids):
+    if current_app.config.get('KPIS_DIARIOS'):
+        consolidacao.retirar(ids)
+
+def incluir_na_consolidacao(*ids):
+    if current_app.config.get('KPIS_DIARIOS'):
+        consolidacao.incluir(ids)
+
+# Relatórios afetados por uma escrita em entregas com data de criação em [inicio, fim] (sem fim,
+# só a data inicio): os gerados pela fila expiram na mesma transação; os em cache saem depois do commit
+def invalidar_relatorios(inicio, fim=None):
+    tarefas.marcar_desatualizadas(inicio, fim)
+    apos_commit(cache_relatorios.invalidar, inicio, fim)
+
+# Campos que a listagem de entregas pode devolver (projeção via ?fields=)
+CAMPOS_LISTA = ('id', 'codigo_rastreio', 'remetente', 'destinatario', 'origem', 'destino', 'status',
+                'data_criacao', 'data_atualizacao', 'data_prevista_entrega')
+
+# Campos exportados integralmente (exportação em streaming)
+CAMPOS_EXPORTACAO = CAMPOS_LISTA + ('motorista_id', 'motivo_atraso', 'motivo_devolucao', 'km', 'peso', 'preco')
+
+# Linhas buscadas por vez do cursor no servidor durante a exportação
+LOTE_EXPORTACAO = 1000
+
+def valor_json(valor):
+    return valor.isoformat() if isinstance(valor, datetime) else valor
+
+def atualizacao_dict(a):
+    return {
+        'id': a.id,
+        'entrega_id': a.entrega_id,
+        'status': a.status,
+        'timestamp': a.timestamp.isoformat() if a.timestamp else None,
+        'localizacao': a.localizacao,
+        'observacoes': a.observacoes,
+        'motivo_atraso': a.motivo_atraso,
+        'motivo_devolucao': a.motivo_devolucao
+    }
+
+# Payload de rastreamento: dados da entrega, motorista e histórico (em ordem cronológica).
+# Espera entrega.atualizacoes e entrega.motorista já carregados (joinedload).
+def rastreamento_dict(entrega):
+    motorista = None
+    if entrega.motorista:
+        motorista = {
+            'id': entrega.motorista.id,
+            'nome': entrega.motorista.username
+        }
+    
+    return {
+        'id': entrega.id,
+        'codigo_rastreio': entrega.codigo_rastreio,
+        'remetente': entrega.remetente,
+        'destinatario': entrega.destinatario,
+        'origem': entrega.origem,
+        'destino': entrega.destino,
+        'status': entrega.status,
+        'data_criacao': entrega.data_criacao.isoformat() if entrega.data_criacao else None,
+        'data_atualizacao': entrega.data_atualizacao.isoformat() if entrega.data_atualizacao else None,
+        'data_prevista_entrega': entrega.data_prevista_entrega.isoformat() if entrega.data_prevista_entrega else None,
+        'motorista_id': entrega.motorista_id,
+        'motivo_atraso': entrega.motivo_atraso,
+        'motivo_devolucao': entrega.motivo_devolucao,
+        'km': entrega.km,
+        'peso': entrega.peso,
+        'preco': entrega.preco,
+        'motorista': motorista,
+        'atualizacoes': [atualizacao_dict(a) for a in entrega.atualizacoes]
+    }
+
+# Filtros aceitos pelas listagens: codigo_rastreio, status, motorista_id, destino, data_inicio e data_fim.
+# Lança ValueError se as datas não estiverem em ISO 8601.
+def filtrar_entregas(consulta, args):
+    if args.get('codigo_rastreio'):
+        consulta = consulta.filter(Entrega.codigo_rastreio.in_(args['codigo_rastreio'].split(',')))
+    if args.get('status'):
+        consulta = consulta.filter(Entrega.status.in_(args['status'].split(',')))
+    if args.get('motorista_id', type=int) is not None:
+        consulta = consulta.filter(Entrega.motorista_id == args.get('motorista_id', type=int))
+    if args.get('destino'):
+        destino = args['destino'].replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        consulta = consulta.filter(Entrega.destino.ilike(f'{destino}%', escape='\\'))
+    if args.get('data_inicio'):
+        consulta = consulta.filter(Entrega.data_criacao >= datetime.fromisoformat(args['data_inicio'].replace('Z', '+00:00')))
+    if args.get('data_fim'):
+        consulta = consulta.filter(Entrega.data_criacao <= datetime.fromisoformat(args['data_fim'].replace('Z', '+00:00')))
+    return consulta
+
+# Uma página da listagem de entregas conforme os parâmetros (fields, filtros, cursor, limite, total).
+# `sessao` é a sessão do Flask-SQLAlchemy ou, no modo ASGI, a sessão síncrona de run_sync.
+# Devolve (entregas, proximo_cursor, total_estimado); lança ValueError com a mensagem de erro 400.
+def listar_entregas(sessao, args):
+    # Projeção de campos (?fields=codigo_rastreio,status,...)
+    campos = CAMPOS_LISTA
+    if args.get('fields'):
+        campos = tuple(c.strip() for c in args['fields'].split(',') if c.strip())
+        invalidos = [c for c in campos if c not in CAMPOS_LISTA]
+        if invalidos:
+            raise ValueError(f'Campos inválidos: {", ".join(invalidos)}')
+    
+    # id e data_criacao sempre são lidos: formam a chave do cursor
+    colunas = [Entrega.id, Entrega.data_criacao] + [getattr(Entrega, c) for c in campos if c not in ('id', 'data_criacao')]
+    consulta = select(*colunas)
+    
+    # Filtros no servidor
+    try:
+        consulta = filtrar_entregas(consulta, args)
+    except ValueError:
+        raise ValueError('Formato de data inválido. Use ISO 8601 (YYYY-MM-DDTHH:MM:SS)')
+    
+    # Estimativa do total (sem COUNT(*) no Postgres), se solicitada
+    total_estimado = paginacao.estimar_total(consulta, sessao) if args.get('total') == 'estimado' else None
+    
+    # Paginação por cursor (keyset) em (data_criacao, id), mais recentes primeiro.
+    # Sem ?limite a página tem LIMITE_PADRAO entregas; a próxima vem em X-Proximo-Cursor/Link.
+    consulta = consulta.order_by(Entrega.data_criacao.desc(), Entrega.id.desc())
+    if args.get('cursor'):
+        cursor_data, cursor_id = paginacao.decodificar_cursor(args['cursor'])
+        consulta = consulta.filter(tuple_(Entrega.data_criacao, Entrega.id) < tuple_(cursor_data, cursor_id))
+    limite = args.get('limite', paginacao.LIMITE_PADRAO, type=int)
+    limite = max(1, min(limite, paginacao.LIMITE_MAXIMO))
+    # Uma linha a mais indica se existe próxima página
+    linhas = sessao.execute(consulta.limit(limite + 1)).all()
+    proximo_cursor = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        proximo_cursor = paginacao.codificar_cursor(linhas[-1].data_criacao, linhas[-1].id)
+    
+    # Converter para dicionário
+    entregas = [{c: valor_json(linha._mapping[c]) for c in campos} for linha in linhas]
+    return entregas, proximo_cursor, total_estimado
+
 @entregas_bp.route('/entregas', methods=['GET'])
 def get_entregas():
     try:
-        # Obter todas as entregas
-        entregas = Entrega.query.all()
-        
-        # Converter para dicionário
-        entregas_dict = []
-        for e in entregas:
-            entregas_dict.append({
-                'id': e.id,
-                'codigo_rastreio': e.codigo_rastreio,
-                'remetente': e.remetente,
-                'destinatario': e.destinatario,
-                'origem': e.origem,
-                'destino': e.destino,
-                'status': e.status,
-                'data_criacao': e.data_criacao.isoformat() if e.data_criacao else None,
-                'data_atualizacao': e.data_atualizacao.isoformat() if e.data_atualizacao else None,
-                'data_prevista_entrega': e.data_prevista_entrega.isoformat() if e.data_prevista_entrega else None
-            })
-        
-        return jsonify(entregas_dict), 200
+        try:
+            entregas, proximo_cursor, total_estimado = listar_entregas(db.session, request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        response = jsonify(entregas)
+        if proximo_cursor:
+            response.headers['X-Proximo-Cursor'] = proximo_cursor
+            args = request.args.to_dict()
+            args['cursor'] = proximo_cursor
+            response.headers['Link'] = f'<{url_for(".get_entregas", **args)}>; rel="next"'
+        if total_estimado is not None:
+            response.headers['X-Total-Estimado'] = str(total_estimado)
+        return response, 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@entregas_bp.route('/entregas/exportar', methods=['GET'])
+def exportar_entregas():
+    try:
+        # Formato: NDJSON (uma entrega por linha) ou um array JSON enviado em partes
+        formato = request.args.get('formato', 'ndjson')
+        if formato not in ('ndjson', 'json'):
+            return jsonify({'error': 'Formato inválido. Use ndjson ou json'}), 400
+        
+        colunas = [getattr(Entrega, c) for c in CAMPOS_EXPORTACAO]
+        try:
+            consulta = filtrar_entregas(db.session.query(*colunas), request.args)
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido. Use ISO 8601 (YYYY-MM-DDTHH:MM:SS)'}), 400
+        
+        # yield_per usa cursor no servidor (stream_results): a memória do worker
+        # fica constante, independentemente do tamanho da tabela
+        consulta = consulta.order_by(Entrega.id).execution_options(yield_per=LOTE_EXPORTACAO)
+        
+        def gerar():
+            if formato == 'json':
+                yield '['
+            primeira = True
+            for linha in consulta:
+                item = json.dumps({c: valor_json(v) for c, v in zip(CAMPOS_EXPORTACAO, linha)})
+                if formato == 'ndjson':
+                    yield item + '\n'
+                else:
+                    yield item if primeira else ',' + item
+                primeira = False
+            if formato == 'json':
+                yield ']'
+        
+        mimetype = 'application/x-ndjson' if formato == 'ndjson' else 'application/json'
+        response = Response(stream_with_context(gerar()), mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename=entregas.{formato}'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@entregas_bp.route('/entregas/busca', methods=['GET'])
+def buscar_entregas():
+    try:
+        # Busca por trecho do código, remetente, destinatário, origem ou destino (?q=joao recife),
+        # sem diferenciar acentos e maiúsculas, mais relevantes primeiro, paginada (?pagina, ?limite).
+        # Com X-Busca-Truncada, só as entregas mais recentes que casam foram ranqueadas: refine o texto
+        texto = request.args.get('q', '').strip()
+        if not texto:
+            return jsonify({'error': 'Informe o texto da busca (q)'}), 400
+        limite = max(1, min(request.args.get('limite', 20, type=int), paginacao.LIMITE_MAXIMO))
+        pagina = max(1, request.args.get('pagina', 1, type=int))
+
+        linhas, tem_proxima, truncada = busca.buscar(texto, limite, pagina)
+        resultados = []
+        for entrega, relevancia in linhas:
+            item = {c: valor_json(getattr(entrega, c)) for c in CAMPOS_LISTA}
+            item['relevancia'] = round(float(relevancia), 3)
+            resultados.append(item)
+
+        response = jsonify(resultados)
+        if tem_proxima:
+            args = request.args.to_dict()
+            args['pagina'] = pagina + 1
+            response.headers['Link'] = f'<{url_for(".buscar_entregas", **args)}>; rel="next"'
+        if truncada:
+            # Texto muito comum: só as busca.MAXIMO_CANDIDATOS entregas mais recentes foram ranqueadas
+            response.headers['X-Busca-Truncada'] = str(busca.MAXIMO_CANDIDATOS)
+        return response, 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @entregas_bp.route('/entregas/<codigo_rastreio>', methods=['GET'])
 def get_entrega(codigo_rastreio):
     try:
-        # Buscar entrega pelo código de rastreio
-        entrega = Entrega.query.filter_by(codigo_rastreio=codigo_rastreio).first()
-        
-        if not entrega:
-            return jsonify({'error': 'Entrega não encontrada'}), 404
-        
-        # Buscar atualizações de status
-        atualizacoes = AtualizacaoStatus.query.filter_by(entrega_id=entrega.id).order_by(AtualizacaoStatus.timestamp).all()
-        
-        # Converter atualizações para dicionário
-        atualizacoes_dict = []
-        for a in atualizacoes:
-            atualizacoes_dict.append({
-                'id': a.id,
-                'status': a.status,
-                'timestamp': a.timestamp.isoformat() if a.timestamp else None,
-                'observacoes': a.observacoes
-            })
-        
-        # Buscar motorista (se existir)
-        motorista = None
-        if hasattr(entrega, 'motorista_id') and entrega.motorista_id:
-            motorista_obj = Usuario.query.get(entrega.motorista_id)
-            if motorista_obj:
-                motorista = {
-                    'id': motorista_obj.id,
-                    'nome': motorista_obj.username
-                }
-        
-        # Converter entrega para dicionário
-        entrega_dict = {
-            'id': entrega.id,
-            'codigo_rastreio': entrega.codigo_rastreio,
-            'remetente': entrega.remetente,
-            'destinatario': entrega.destinatario,
-            'origem': entrega.origem,
-            'destino': entrega.destino,
-            'status': entrega.status,
-            'data_criacao': entrega.data_criacao.isoformat() if entrega.data_criacao else None,
-            'data_atualizacao': entrega.data_atualizacao.isoformat() if entrega.data_atualizacao else None,
-            'data_prevista_entrega': entrega.data_prevista_entrega.isoformat() if entrega.data_prevista_entrega else None,
-            'motorista': motorista,
-            'atualizacoes': atualizacoes_dict
-        }
-        
-        return jsonify(entrega_dict), 200
+        # Consultas repetidas do mesmo código são atendidas pelo cache, sem banco nem serialização
+        em_cache = cache_rastreamento.obter(codigo_rastreio)
+        if em_cache is None:
+            # Entrega, histórico e motorista em uma única consulta (JOINs com carregamento antecipado)
+            entrega = db.session.query(Entrega).options(
+                joinedload(Entrega.atualizacoes),
+                joinedload(Entrega.motorista)
+            ).filter(Entrega.codigo_rastreio == codigo_rastreio).first()
+            
+            if not entrega:
+                return jsonify({'error': 'Entrega não encontrada'}), 404
+            
+            corpo = jsonify(rastreamento_dict(entrega)).get_data()
+            em_cache = cache_rastreamento.guardar(codigo_rastreio, corpo, entrega)
+        
+        # ETag/Last-Modified: If-None-Match ou If-Modified-Since com a versão atual devolvem 304
+        response = Response(em_cache['corpo'], status=200, mimetype='application/json')
+        response.set_etag(em_cache['etag'])
+        response.last_modified = em_cache['modificado']
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @entregas_bp.route('/entregas', methods=['POST'])
+@transacional
 def create_entrega():
     try:
         data = request.get_json()
@@ -105,8 +299,8 @@ def create_entrega():
             origem=data['origem'],
             destino=data['destino'],
             status='Registrado',
-            data_criacao=datetime.now(),
-            data_atualizacao=datetime.now()
+            data_criacao=datetime.utcnow(),
+            data_atualizacao=datetime.utcnow()
         )
         
         # Adicionar data prevista de entrega se fornecida
@@ -124,18 +318,23 @@ def create_entrega():
             nova_entrega.motorista_id = data['motorista_id']
         
         db.session.add(nova_entrega)
-        db.session.commit()
+        # flush: gera o id da entrega; o commit (único) fica para o fim da requisição
+        db.session.flush()
         
         # Adicionar primeira atualização de status
         atualizacao = AtualizacaoStatus(
             entrega_id=nova_entrega.id,
             status='Registrado',
-            timestamp=datetime.now(),
+            timestamp=datetime.utcnow(),
             observacoes='Entrega registrada no sistema'
         )
         
         db.session.add(atualizacao)
-        db.session.commit()
+        db.session.flush()
+        incluir_na_consolidacao(nova_entrega.id)
+        eventos.publicar([eventos.evento(atualizacao, nova_entrega)])
+        invalidar_relatorios(nova_entrega.data_criacao)
+        apos_commit(metricas.registrar_entregas_criadas, 1)
         
         return jsonify({
             'message': 'Entrega criada com sucesso',
@@ -146,7 +345,77 @@ def create_entrega():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@entregas_bp.route('/entregas/lote', methods=['POST'])
+@transacional
+def create_entregas_lote():
+    try:
+        # Lote de entregas: array JSON, NDJSON ou CSV (corpo ou arquivo no campo "arquivo")
+        try:
+            registros = lotes.ler_registros(request)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Entregas válidas e seus históricos iniciais entram em uma única transação;
+        # os registros inválidos voltam com o número da linha e o motivo
+        criadas, erros = lotes.criar_entregas(registros)
+        if criadas:
+            incluir_na_consolidacao(*(id for id, _ in criadas))
+            invalidar_relatorios(datetime.utcnow())
+            apos_commit(metricas.registrar_entregas_criadas, len(criadas), 'lote')
+
+        status = 201 if not erros else (207 if criadas else 400)
+        return jsonify({
+            'message': f'{len(criadas)} entregas criadas',
+            'criadas': len(criadas),
+            'entregas': [{'id': id, 'codigo_rastreio': codigo} for id, codigo in criadas],
+            'erros': erros
+        }), status
+    except IntegrityError:
+        # Código cadastrado por outra requisição entre a validação e o INSERT
+        db.session.rollback()
+        return jsonify({'error': 'Código de rastreio já existe'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@entregas_bp.route('/entregas/status/lote', methods=['POST'])
+@transacional
+def add_status_lote():
+    try:
+        # Eventos de status em lote: array JSON (ou {"eventos": [...]}), NDJSON ou CSV, cada um com
+        # codigo_rastreio, status e, opcionalmente, motivo, observacoes, localizacao, timestamp e chave_idempotencia
+        try:
+            registros = lotes.ler_registros(request, 'eventos')
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        perfil.definir_blocos(len(registros), lotes.BLOCO)
+
+        aplicados, duplicados, erros, alteradas, atualizadas = lotes.atualizar_status(registros, retirar_da_consolidacao)
+        incluir_na_consolidacao(*atualizadas)
+        # Relatórios do intervalo de datas de criação das entregas com histórico novo
+        datas = [entrega.data_criacao for entrega in alteradas]
+        if datas:
+            invalidar_relatorios(min(datas), max(datas))
+        apos_commit(cache_rastreamento.invalidar, *(entrega.codigo_rastreio for entrega in alteradas))
+
+        # Reenvios (chave_idempotencia já gravada) não são erro: o evento já está no histórico
+        status = 200 if not erros else (207 if aplicados or duplicados else 400)
+        return jsonify({
+            'message': f'{aplicados} atualizações de status registradas',
+            'aplicados': aplicados,
+            'duplicados': duplicados,
+            'erros': erros
+        }), status
+    except IntegrityError:
+        # Mesmo evento gravado por outra requisição ao mesmo tempo: reenviar o lote é seguro
+        db.session.rollback()
+        return jsonify({'error': 'Evento já registrado por outra requisição. Reenvie o lote'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @entregas_bp.route('/entregas/<codigo_rastreio>', methods=['PUT'])
+@transacional
 def update_entrega(codigo_rastreio):
     try:
         data = request.get_json()
@@ -156,6 +425,7 @@ def update_entrega(codigo_rastreio):
         
         if not entrega:
             return jsonify({'error': 'Entrega não encontrada'}), 404
+        retirar_da_consolidacao(entrega.id)
         
         # Atualizar campos
         if 'remetente' in data:
@@ -181,21 +451,24 @@ def update_entrega(codigo_rastreio):
             entrega.motorista_id = data['motorista_id']
         
         # Atualizar data de atualização
-        entrega.data_atualizacao = datetime.now()
-        
-        db.session.commit()
+        entrega.data_atualizacao = datetime.utcnow()
         
-        # Adicionar nova atualização de status se o status foi alterado
+        # Adicionar nova atualização de status se o status foi alterado (mesma transação)
         if 'status' in data:
             atualizacao = AtualizacaoStatus(
                 entrega_id=entrega.id,
                 status=data['status'],
-                timestamp=datetime.now(),
+                timestamp=datetime.utcnow(),
                 observacoes=data.get('observacoes', f'Status atualizado para {data["status"]}')
             )
             
             db.session.add(atualizacao)
-            db.session.commit()
+            db.session.flush()
+            eventos.publicar([eventos.evento(atualizacao, entrega)])
+        db.session.flush()
+        incluir_na_consolidacao(entrega.id)
+        invalidar_relatorios(entrega.data_criacao)
+        apos_commit(cache_rastreamento.invalidar, entrega.codigo_rastreio)
         
         return jsonify({
             'message': 'Entrega atualizada com sucesso',
@@ -207,6 +480,7 @@ def update_entrega(codigo_rastreio):
         return jsonify({'error': str(e)}), 500
 
 @entregas_bp.route('/entregas/<codigo_rastreio>/status', methods=['POST'])
+@transacional
 def add_status(codigo_rastreio):
     try:
         data = request.get_json()
@@ -220,27 +494,34 @@ def add_status(codigo_rastreio):
         
         if not entrega:
             return jsonify({'error': 'Entrega não encontrada'}), 404
+        retirar_da_consolidacao(entrega.id)
         
         # Adicionar nova atualização de status
         atualizacao = AtualizacaoStatus(
             entrega_id=entrega.id,
             status=data['status'],
-            timestamp=datetime.now(),
-            observacoes=data.get('observacoes', '')
+            timestamp=datetime.utcnow(),
+            observacoes=data.get('observacoes', ''),
+            localizacao=data.get('localizacao')
         )
         
         # Atualizar status da entrega
         entrega.status = data['status']
-        entrega.data_atualizacao = datetime.now()
+        entrega.data_atualizacao = datetime.utcnow()
         
         # Adicionar motivo de atraso ou devolução se fornecido
         if data['status'] == 'Atrasado' and 'motivo' in data:
-            entrega.motivo_atraso = data['motivo']
+            entrega.motivo_atraso = atualizacao.motivo_atraso = data['motivo']
         elif data['status'] == 'Devolvido' and 'motivo' in data:
-            entrega.motivo_devolucao = data['motivo']
+            entrega.motivo_devolucao = atualizacao.motivo_devolucao = data['motivo']
         
         db.session.add(atualizacao)
-        db.session.commit()
+        # flush: gera o id da atualização para a resposta e para o evento ao vivo
+        db.session.flush()
+        incluir_na_consolidacao(entrega.id)
+        eventos.publicar([eventos.evento(atualizacao, entrega)])
+        invalidar_relatorios(entrega.data_criacao)
+        apos_commit(cache_rastreamento.invalidar, entrega.codigo_rastreio)
         
         return jsonify({
             'message': 'Status adicionado com sucesso',
@@ -0,0 +1,84 @@
+import queue
+from collections import deque
+from flask import Blueprint, request, jsonify, current_app, Response
+from services import eventos, autenticacao
+
+# Definir o blueprint
+eventos_bp = Blueprint('eventos', __name__)
+
+@eventos_bp.before_request
+def exigir_autenticacao():
+    # O stream traz códigos, motoristas, observações e localização: exige token (cookie no EventSource)
+    return autenticacao.exigir()
+
+# Intervalo entre comentários de keep-alive no stream (segundos)
+INTERVALO_PING = 15
+
+@eventos_bp.route('/eventos/status', methods=['GET'])
+def stream_status():
+    try:
+        # Filtros: ?motorista_id=, ?status=Entregue,Atrasado e ?codigo_rastreio=BR1,BR2
+        filtros = {
+            'motorista_id': request.args.get('motorista_id', type=int),
+            'status': set(request.args['status'].split(',')) if request.args.get('status') else None,
+            'codigo_rastreio': set(request.args['codigo_rastreio'].split(',')) if request.args.get('codigo_rastreio') else None
+        }
+        
+        # Reconexão: o navegador envia o id do último evento recebido
+        ultimo_id = request.headers.get('Last-Event-ID', request.args.get('ultimo_id'))
+        try:
+            ultimo_id = int(ultimo_id) if ultimo_id else None
+        except ValueError:
+            return jsonify({'error': 'Last-Event-ID inválido'}), 400
+        
+        # Assina antes de buscar os perdidos para não perder eventos no intervalo
+        fila = eventos.assinar(current_app._get_current_object(), filtros)
+        if fila is None:
+            response = jsonify({'error': 'Limite de conexões de eventos atingido. Tente novamente em instantes'})
+            response.headers['Retry-After'] = str(INTERVALO_PING)
+            return response, 503
+        try:
+            perdidos = eventos.desde(ultimo_id, filtros) if ultimo_id is not None else []
+        except Exception:
+            eventos.cancelar(fila)
+            raise
+        
+        # O gerador não usa o banco: a sessão é liberada ao fim desta função
+        def gerar():
+            # Ids enviados recentemente: os eventos podem ser confirmados fora da ordem dos ids,
+            # então um id menor que o último enviado ainda pode ser novo
+            recentes = deque(maxlen=eventos.MAXIMO_RETOMADA)
+            enviados = set()
+            
+            def registrar(id):
+                if len(recentes) == recentes.maxlen:
+                    enviados.discard(recentes[0])
+                recentes.append(id)
+                enviados.add(id)
+            
+            try:
+                yield 'retry: 3000\n\n'
+                for e in perdidos:
+                    registrar(e['id'])
+                    yield eventos.formatar_sse(e)
+                while True:
+                    try:
+                        e = fila.get(timeout=INTERVALO_PING)
+                    except queue.Empty:
+                        yield ': ping\n\n'
+                        continue
+                    if e is None:
+                        break
+                    if e['id'] in enviados:
+                        continue
+                    registrar(e['id'])
+                    yield eventos.formatar_sse(e)
+            finally:
+                eventos.cancelar(fila)
+        
+        response = Response(gerar(), mimetype='text/event-stream')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
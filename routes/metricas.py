@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+from services import metricas
+
+# Definir o blueprint
+metricas_bp = Blueprint('metricas', __name__)
+
+@metricas_bp.route('/metrics', methods=['GET'])
+def get_metricas():
+    # Métricas de todos os workers no formato de exposição do Prometheus
+    corpo, tipo = metricas.gerar()
+    return Response(corpo, content_type=tipo)
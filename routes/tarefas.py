@@ -0,0 +1,80 @@
+import os
+from flask import Blueprint, request, jsonify, current_app, url_for, send_file
+from services import tarefas, autenticacao
+from services.relatorios import resolver_periodo
+
+# Definir o blueprint
+tarefas_bp = Blueprint('tarefas', __name__)
+
+@tarefas_bp.before_request
+def exigir_autenticacao():
+    return autenticacao.exigir()
+
+def tarefa_dict(tarefa):
+    tarefa_json = tarefa.to_dict()
+    if tarefa.status == 'concluida':
+        tarefa_json['download'] = url_for('.download_tarefa', tarefa_id=tarefa.id)
+    return tarefa_json
+
+@tarefas_bp.route('/relatorio/tarefas', methods=['POST'])
+def create_tarefa():
+    try:
+        data = request.get_json() or {}
+        
+        # Verificar o tipo de relatório
+        tipo = data.get('tipo')
+        if tipo not in tarefas.TIPOS:
+            return jsonify({'error': f'Tipo de relatório inválido. Use: {", ".join(tarefas.TIPOS)}'}), 400
+        
+        # Mesmo formato de período dos endpoints de relatório
+        try:
+            data_inicio, data_fim = resolver_periodo(
+                data.get('periodo', 'mes'),
+                data.get('data_inicio'),
+                data.get('data_fim')
+            )
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido. Use ISO 8601 (YYYY-MM-DDTHH:MM:SS)'}), 400
+        
+        tarefa, nova = tarefas.enfileirar(current_app._get_current_object(), tipo, data_inicio, data_fim)
+        
+        # 202 para tarefa nova; 200 quando um resultado pronto ou em andamento foi reaproveitado
+        response = jsonify(tarefa_dict(tarefa))
+        response.headers['Location'] = url_for('.get_tarefa', tarefa_id=tarefa.id)
+        return response, 202 if nova else 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tarefas_bp.route('/relatorio/tarefas/<tarefa_id>', methods=['GET'])
+def get_tarefa(tarefa_id):
+    try:
+        tarefa = tarefas.buscar(tarefa_id)
+        if not tarefa:
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
+        
+        return jsonify(tarefa_dict(tarefa)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@tarefas_bp.route('/relatorio/tarefas/<tarefa_id>/download', methods=['GET'])
+def download_tarefa(tarefa_id):
+    try:
+        tarefa = tarefas.buscar(tarefa_id)
+        if not tarefa:
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
+        
+        if tarefa.status == 'expirada':
+            return jsonify({'error': 'Relatório desatualizado por alterações nas entregas. Gere novamente'}), 410
+        
+        if tarefa.status != 'concluida':
+            return jsonify({'error': 'Relatório ainda não está pronto', 'status': tarefa.status}), 409
+        
+        # Resultado substituído por uma geração mais nova do mesmo relatório
+        if not tarefa.arquivo or not os.path.exists(tarefa.arquivo):
+            return jsonify({'error': 'Relatório não está mais disponível. Gere novamente'}), 410
+        
+        # Enviado do arquivo em partes, sem carregá-lo em memória
+        return send_file(tarefa.arquivo, mimetype=tarefa.mimetype, as_attachment=True,
+                         download_name=tarefa.nome_arquivo)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
-from werkzeug.security import generate_password_hash
 from models.models import db, Usuario
+from services import senhas, autenticacao
+from services.transacao import transacional, apos_commit
 
 # Definir o blueprint
 user_bp = Blueprint('user', __name__)
 
+@user_bp.before_request
+def exigir_autenticacao():
+    # Consulta para qualquer usuário autenticado; cadastro, alteração e exclusão só para admin
+    return autenticacao.exigir(None if request.method == 'GET' else ('admin',))
+
 @user_bp.route('/usuarios', methods=['GET'])
 def get_usuarios():
     try:
@@ -45,6 +51,7 @@ def get_usuario(id):
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/usuarios', methods=['POST'])
+@transacional
 def create_usuario():
     try:
         data = request.get_json()
@@ -60,12 +67,14 @@ def create_usuario():
         # Criar novo usuário
         novo_usuario = Usuario(
             username=data['username'],
-            password_hash=generate_password_hash(data['password']),
+            password_hash=senhas.gerar_hash(data['password']),
             perfil=data.get('perfil', 'usuario')  # Perfil padrão é 'usuario'
         )
         
         db.session.add(novo_usuario)
-        db.session.commit()
+        # flush: gera o id do usuário; o commit acontece ao fim da requisição
+        db.session.flush()
+        apos_commit(autenticacao.desmarcar_inexistente, novo_usuario.username)
         
         return jsonify({
             'message': 'Usuário criado com sucesso',
@@ -77,6 +86,7 @@ def create_usuario():
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/usuarios/<int:id>', methods=['PUT'])
+@transacional
 def update_usuario(id):
     try:
         data = request.get_json()
@@ -94,14 +104,17 @@ def update_usuario(id):
             if existing and existing.id != id:
                 return jsonify({'error': 'Nome de usuário já existe'}), 400
             usuario.username = data['username']
+            apos_commit(autenticacao.desmarcar_inexistente, usuario.username)
         
         if 'password' in data:
-            usuario.password_hash = generate_password_hash(data['password'])
+            usuario.password_hash = senhas.gerar_hash(data['password'])
         
         if 'perfil' in data:
             usuario.perfil = data['perfil']
-        
-        db.session.commit()
+
+        # Tokens emitidos carregam username e perfil: os antigos deixam de valer
+        if any(k in data for k in ('username', 'password', 'perfil')):
+            apos_commit(autenticacao.revogar_usuario, usuario.id)
         
         return jsonify({
             'message': 'Usuário atualizado com sucesso',
@@ -113,6 +126,7 @@ def update_usuario(id):
         return jsonify({'error': str(e)}), 500
 
 @user_bp.route('/usuarios/<int:id>', methods=['DELETE'])
+@transacional
 def delete_usuario(id):
     try:
         # Buscar usuário pelo ID
@@ -122,7 +136,7 @@ def delete_usuario(id):
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
         db.session.delete(usuario)
-        db.session.commit()
+        apos_commit(autenticacao.revogar_usuario, usuario.id)
         
         return jsonify({
             'message': 'Usuário excluído com sucesso'
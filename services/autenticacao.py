@@ -0,0 +1,141 @@
+import os
+import time
+import uuid
+from flask import current_app, g, jsonify, request # type: ignore
+from itsdangerous import BadSignature, URLSafeTimedSerializer # type: ignore
+from services.cache_relatorios import CacheMemoria, CacheRedis
+
+# Tokens assinados (itsdangerous + SECRET_KEY) com id, username e perfil do usuário:
+# validar um token não consulta o banco. Enviados em "Authorization: Bearer <token>"
+# ou no cookie "token" (gravado pelo login, para as páginas servidas pelo próprio app).
+VALIDADE = int(os.environ.get('TOKEN_VALIDADE', str(8 * 3600)))  # um turno
+COOKIE = 'token'
+SALT = 'autenticacao'
+# Tokens já validados mantidos em memória (evita refazer assinatura/decodificação)
+MAXIMO_CACHE = int(os.environ.get('TOKEN_CACHE_MAX', '10000'))
+
+_serializador = None
+_validados = CacheMemoria(maximo=MAXIMO_CACHE)
+
+
+def _criar_revogados():
+    # Revogações (logout, troca de senha/perfil, exclusão) ficam até o token expirar.
+    # Em memória valem só para o worker que revogou; com TOKEN_REVOGACAO_URL=redis://...
+    # são compartilhadas entre os workers.
+    url = os.environ.get('TOKEN_REVOGACAO_URL', '')
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return CacheRedis(url, maximo=100000, prefixo='token')
+    return CacheMemoria(maximo=100000)
+
+
+_revogados = _criar_revogados()
+
+# Usernames sem cadastro, lembrados por pouco tempo: tentativas repetidas com nomes inexistentes
+# (força bruta, robôs) não consultam o banco nem calculam hash. Só com o Redis compartilhado
+# (TOKEN_REVOGACAO_URL=redis://...): o cadastro remove o nome para todos os workers de uma vez.
+# Em memória, por worker, um cadastro feito em outro worker recusaria o login até o TTL vencer;
+# sem Redis, então, o login sempre consulta o banco.
+TTL_INEXISTENTES = int(os.environ.get('LOGIN_INEXISTENTES_TTL', '30'))
+
+
+def _criar_inexistentes():
+    url = os.environ.get('TOKEN_REVOGACAO_URL', '')
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return CacheRedis(url, maximo=MAXIMO_CACHE, prefixo='login_inexistente')
+    return None
+
+
+_inexistentes = _criar_inexistentes()
+
+
+def usuario_inexistente(username):
+    return _inexistentes is not None and _inexistentes.obter(username) is not None
+
+
+def marcar_inexistente(username):
+    if _inexistentes is not None:
+        _inexistentes.guardar(username, True, TTL_INEXISTENTES)
+
+
+def desmarcar_inexistente(username):
+    # Cadastro ou troca de username: o nome passa a existir
+    if _inexistentes is not None:
+        _inexistentes.remover(username)
+
+
+def init_app(app):
+    global _serializador
+    _serializador = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt=SALT)
+
+
+def emitir(id, username, perfil):
+    return _serializador.dumps({
+        'id': id,
+        'username': username,
+        'perfil': perfil,
+        'jti': uuid.uuid4().hex,
+        'iat': time.time()
+    })
+
+
+def _decodificar(token):
+    principal = _validados.obter(token)
+    if principal is None:
+        try:
+            principal = _serializador.loads(token, max_age=VALIDADE)
+        except BadSignature:
+            # Assinatura inválida ou token expirado (SignatureExpired é subclasse)
+            return None
+        restante = principal['iat'] + VALIDADE - time.time()
+        if restante <= 0:
+            return None
+        _validados.guardar(token, principal, restante)
+    elif principal['iat'] + VALIDADE < time.time():
+        return None
+    return principal
+
+
+def _revogado(principal):
+    if _revogados.obter(f"jti:{principal['jti']}") is not None:
+        return True
+    revogado_em = _revogados.obter(f"usuario:{principal['id']}")
+    return revogado_em is not None and principal['iat'] <= revogado_em
+
+
+def principal(token):
+    # {id, username, perfil, jti, iat} do token, ou None se inválido, expirado ou revogado
+    if not token:
+        return None
+    dados = _decodificar(token)
+    if dados is None or _revogado(dados):
+        return None
+    return dados
+
+
+def token_da_requisicao(cabecalhos, cookies):
+    autorizacao = cabecalhos.get('Authorization', '')
+    if autorizacao.startswith('Bearer '):
+        return autorizacao[len('Bearer '):].strip()
+    return cookies.get(COOKIE)
+
+
+def revogar(dados):
+    # Logout: só este token
+    _revogados.guardar(f"jti:{dados['jti']}", True, max(1, int(dados['iat'] + VALIDADE - time.time())))
+
+
+def revogar_usuario(id):
+    # Troca de senha/perfil ou exclusão: todos os tokens emitidos até agora para o usuário
+    _revogados.guardar(f'usuario:{id}', time.time(), VALIDADE)
+
+
+def exigir(perfis=None):
+    # Para rotas Flask: None se autorizado (g.usuario = principal), senão a resposta 401/403
+    if not current_app.config.get('AUTH_OBRIGATORIA', True) or request.method == 'OPTIONS':
+        return None
+    g.usuario = principal(token_da_requisicao(request.headers, request.cookies))
+    if g.usuario is None:
+        return jsonify({'error': 'Não autenticado'}), 401
+    if perfis and g.usuario['perfil'] not in perfis:
+        return jsonify({'error': 'Acesso negado'}), 403
+    return None
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+import uuid
+from flask import g, has_request_context # type: ignore
+from sqlalchemy import event # type: ignore
+from sqlalchemy.exc import TimeoutError # type: ignore
+from sqlalchemy.engine import make_url # type: ignore
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool # type: ignore
+from services import metricas
+
+# Pool de conexões configurável por variáveis de ambiente:
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT (s), DB_POOL_RECYCLE (s), DB_POOL_PRE_PING (0/1),
+#   DB_STATEMENT_TIMEOUT_MS (0 = sem limite) e DB_PGBOUNCER=1 (PgBouncer em modo transação).
+POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', '5'))
+MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', '10'))
+POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', '30'))
+# Conexões mais antigas que isso são renovadas (o Postgres hospedado derruba conexões ociosas)
+POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', '1800'))
+POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', '0'))
+PGBOUNCER = os.environ.get('DB_PGBOUNCER', '0') == '1'
+
+# Espera por uma conexão acima disso conta como espera no pool
+LIMIAR_ESPERA_MS = 1.0
+
+
+class _Estatisticas:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.esperas = 0
+        self.espera_total_ms = 0.0
+        self.espera_maxima_ms = 0.0
+        self.timeouts = 0
+        self.conexoes_abertas = 0
+        self.invalidadas = 0
+
+    def registrar_espera(self, espera_ms):
+        with self._lock:
+            self.checkouts += 1
+            self.espera_total_ms += espera_ms
+            self.espera_maxima_ms = max(self.espera_maxima_ms, espera_ms)
+            if espera_ms > LIMIAR_ESPERA_MS:
+                self.esperas += 1
+        metricas.registrar_espera_pool(espera_ms)
+
+    def incrementar(self, campo):
+        with self._lock:
+            setattr(self, campo, getattr(self, campo) + 1)
+        metricas.registrar_evento_pool(campo)
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'esperas': self.esperas,
+                'espera_total_ms': round(self.espera_total_ms, 3),
+                'espera_maxima_ms': round(self.espera_maxima_ms, 3),
+                'timeouts': self.timeouts,
+                'conexoes_abertas': self.conexoes_abertas,
+                'invalidadas': self.invalidadas
+            }
+
+
+estatisticas = _Estatisticas()
+
+
+def _medir_checkout(obter):
+    # Tempo até o pool entregar uma conexão (fila de espera + abertura de conexão nova)
+    inicio = time.perf_counter()
+    try:
+        return obter()
+    except TimeoutError:
+        # Pool esgotado por mais de DB_POOL_TIMEOUT segundos
+        estatisticas.incrementar('timeouts')
+        raise
+    finally:
+        espera_ms = (time.perf_counter() - inicio) * 1000
+        estatisticas.registrar_espera(espera_ms)
+        if has_request_context():
+            g.espera_pool_ms = g.get('espera_pool_ms', 0.0) + espera_ms
+
+
+class PoolInstrumentado(QueuePool):
+    def _do_get(self):
+        try:
+            return _medir_checkout(super()._do_get)
+        finally:
+            metricas.atualizar_pool(self)
+
+    def _do_return_conn(self, registro):
+        super()._do_return_conn(registro)
+        metricas.atualizar_pool(self)
+
+
+class PoolAssincronoInstrumentado(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        try:
+            return _medir_checkout(super()._do_get)
+        finally:
+            metricas.atualizar_pool(self)
+
+    def _do_return_conn(self, registro):
+        super()._do_return_conn(registro)
+        metricas.atualizar_pool(self)
+
+
+def opcoes_engine(url, assincrono=False):
+    # Opções do create_engine (SQLALCHEMY_ENGINE_OPTIONS) para a URL do banco
+    url = make_url(url)
+    if url.get_backend_name() != 'postgresql':
+        # SQLite (desenvolvimento/testes): pool padrão do SQLAlchemy
+        return {}
+
+    opcoes = {
+        'poolclass': PoolAssincronoInstrumentado if assincrono else PoolInstrumentado,
+        'pool_size': POOL_SIZE,
+        'max_overflow': MAX_OVERFLOW,
+        'pool_timeout': POOL_TIMEOUT,
+        'pool_recycle': POOL_RECYCLE,
+        'pool_pre_ping': POOL_PRE_PING,
+    }
+    connect_args = {}
+    if PGBOUNCER:
+        # PgBouncer em modo transação: sem prepared statements no servidor (asyncpg os usa por padrão;
+        # o psycopg2 não usa) e sem parâmetros de inicialização da sessão
+        if assincrono:
+            connect_args.update(
+                statement_cache_size=0,
+                prepared_statement_cache_size=0,
+                prepared_statement_name_func=lambda: f'__asyncpg_{uuid.uuid4()}__'
+            )
+    elif STATEMENT_TIMEOUT_MS:
+        if assincrono:
+            connect_args['server_settings'] = {'statement_timeout': str(STATEMENT_TIMEOUT_MS)}
+        else:
+            connect_args['options'] = f'-c statement_timeout={STATEMENT_TIMEOUT_MS}'
+    if connect_args:
+        opcoes['connect_args'] = connect_args
+    return opcoes
+
+
+def instrumentar(engine):
+    # Contadores de conexões do pool (o tempo de banco por requisição fica em services/perfil.py)
+    @event.listens_for(engine, 'connect')
+    def conexao_aberta(conexao, registro):
+        estatisticas.incrementar('conexoes_abertas')
+
+    @event.listens_for(engine, 'invalidate')
+    def conexao_invalidada(conexao, registro, excecao):
+        estatisticas.incrementar('invalidadas')
+
+    if PGBOUNCER and STATEMENT_TIMEOUT_MS:
+        # Com PgBouncer o limite vale só para a transação (SET LOCAL), para não vazar para outros clientes
+        @event.listens_for(engine, 'begin')
+        def limitar_transacao(conexao):
+            conexao.exec_driver_sql(f'SET LOCAL statement_timeout = {STATEMENT_TIMEOUT_MS}')
+
+
+def status_pool(engine):
+    pool = engine.pool
+    situacao = {'pid': os.getpid(), 'classe': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        situacao.update(
+            tamanho=pool.size(),
+            em_uso=pool.checkedout(),
+            livres=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=MAX_OVERFLOW,
+        )
+    situacao.update(estatisticas.to_dict())
+    return situacao
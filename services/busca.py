@@ -0,0 +1,91 @@
+import os
+import unicodedata
+from sqlalchemy import case, event, func, literal, or_, select # type: ignore
+from models.models import db, Entrega
+
+# Busca de entregas por código, remetente, destinatário, origem e destino.
+# Os cinco campos ficam normalizados (sem acentos, minúsculos) em entregas.termos_busca,
+# gravado pela aplicação: "joão" encontra "João" e "sao paulo" encontra "São Paulo" em
+# qualquer banco. No Postgres a coluna tem índice GIN de trigramas (pg_trgm), que atende
+# LIKE '%termo%' e a relevância por word_similarity; no SQLite (testes) é varredura.
+# Só as MAXIMO_CANDIDATOS entregas mais recentes que casam são ranqueadas: termos muito comuns
+# ("pb") não ordenam a tabela inteira a cada página. Quando há mais candidatas, a busca avisa que
+# o resultado foi truncado (refinar o texto). Um código de rastreio exato entra sempre, pelo índice único.
+CAMPOS = ('codigo_rastreio', 'remetente', 'destinatario', 'origem', 'destino')
+
+# Quantas entregas, no máximo, são ranqueadas por busca
+MAXIMO_CANDIDATOS = int(os.environ.get('BUSCA_CANDIDATOS', '1000'))
+
+def normalizar(texto):
+    # Minúsculas, sem acentos e com espaços simples
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    sem_acentos = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acentos.casefold().split())
+
+
+def termos(valores):
+    # Conteúdo de termos_busca para um dict/objeto com os campos da entrega
+    obter = valores.get if isinstance(valores, dict) else lambda campo: getattr(valores, campo, None)
+    return ' '.join(normalizar(obter(campo)) for campo in CAMPOS if obter(campo))
+
+
+@event.listens_for(Entrega, 'before_insert')
+@event.listens_for(Entrega, 'before_update')
+def atualizar_termos(mapper, conexao, entrega):
+    # Inserções e alterações pelo ORM; os INSERTs em lote (services/lotes) preenchem a coluna direto
+    entrega.termos_busca = termos(entrega)
+
+
+def _escapar(termo):
+    return termo.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def buscar(texto, limite, pagina=1):
+    # Entregas que contêm todas as palavras de `texto`, mais relevantes primeiro.
+    # Devolve (linhas, tem_proxima, truncada); cada linha tem os campos da entrega e `relevancia`;
+    # truncada indica que havia mais de MAXIMO_CANDIDATOS entregas e só as mais recentes foram ranqueadas.
+    consulta_normalizada = normalizar(texto)
+    palavras = consulta_normalizada.split()
+    if not palavras:
+        return [], False, False
+
+    # Candidatas: contêm todas as palavras (índice de trigramas no Postgres), as mais recentes primeiro;
+    # uma a mais que o máximo para saber se houve corte
+    recentes = select(Entrega.id).where(
+        *(Entrega.termos_busca.like(f'%{_escapar(p)}%', escape='\\') for p in palavras)
+    ).order_by(Entrega.data_criacao.desc(), Entrega.id.desc()).limit(MAXIMO_CANDIDATOS + 1)
+    ids = db.session.scalars(recentes).all()
+    truncada = len(ids) > MAXIMO_CANDIDATOS
+    ids = ids[:MAXIMO_CANDIDATOS]
+    # Código exato (índice único de codigo_rastreio), mesmo fora das mais recentes
+    codigo_texto = texto.strip()
+    if truncada and len(palavras) == 1:
+        ids += db.session.scalars(select(Entrega.id).where(
+            Entrega.codigo_rastreio.in_({codigo_texto, codigo_texto.upper()})
+        )).all()
+    if not ids:
+        return [], False, False
+
+    # Relevância: código exato (3) > prefixo do código (2), mais a fração das palavras que
+    # começam um termo (ex.: "rec" em "recife", e não em "correcao").
+    # No Postgres soma-se a semelhança por trigramas entre a busca e os termos da entrega.
+    codigo = func.lower(Entrega.codigo_rastreio)
+    relevancia = case(
+        (codigo == consulta_normalizada, 3.0),
+        (codigo.like(f'{_escapar(consulta_normalizada)}%', escape='\\'), 2.0),
+        else_=0.0
+    )
+    for palavra in palavras:
+        relevancia = relevancia + case(
+            (or_(Entrega.termos_busca.like(f'{_escapar(palavra)}%', escape='\\'),
+                 Entrega.termos_busca.like(f'% {_escapar(palavra)}%', escape='\\')), 1.0 / len(palavras)),
+            else_=0.0
+        )
+    if db.session.get_bind().dialect.name == 'postgresql':
+        relevancia = relevancia + func.word_similarity(literal(consulta_normalizada), Entrega.termos_busca)
+    relevancia = relevancia.label('relevancia')
+
+    linhas = db.session.query(Entrega, relevancia).filter(Entrega.id.in_(set(ids))).order_by(
+        relevancia.desc(), Entrega.data_criacao.desc(), Entrega.id.desc()
+    ).offset((pagina - 1) * limite).limit(limite + 1).all()
+    return linhas[:limite], len(linhas) > limite, truncada
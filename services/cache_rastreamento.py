@@ -0,0 +1,36 @@
+import hashlib
+import os
+from services.cache_relatorios import CacheMemoria
+
+# Respostas já serializadas de GET /api/entregas/<codigo_rastreio>, por código de rastreio.
+# Cada worker tem o seu LRU: add_status e update_entrega removem a entrada no worker que
+# atendeu a escrita, e o TTL limita o tempo em que os demais servem a versão anterior.
+TTL = int(os.environ.get('RASTREIO_CACHE_TTL', '30'))
+MAXIMO_ENTRADAS = int(os.environ.get('RASTREIO_CACHE_MAX', '10000'))
+
+_cache = CacheMemoria(MAXIMO_ENTRADAS)
+
+
+def versao(entrega):
+    # ETag da entrega: muda a cada escrita (data_atualizacao)
+    atualizada = entrega.data_atualizacao.isoformat() if entrega.data_atualizacao else ''
+    return hashlib.sha1(f'{entrega.id}|{atualizada}'.encode('utf-8')).hexdigest()
+
+
+def obter(codigo_rastreio):
+    # Devolve {'corpo', 'etag', 'modificado'} ou None
+    return _cache.obter(codigo_rastreio)
+
+
+def guardar(codigo_rastreio, corpo, entrega):
+    entrada = {
+        'corpo': corpo,
+        'etag': versao(entrega),
+        'modificado': entrega.data_atualizacao
+    }
+    _cache.guardar(codigo_rastreio, entrada, TTL)
+    return entrada
+
+
+def invalidar(*codigos):
+    _cache.remover(*codigos)
@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+
+# Cache de resultados dos relatórios, por endpoint + período normalizado.
+# Períodos abertos expiram após RELATORIO_CACHE_TTL segundos. Períodos inteiramente no passado
+# ficam no Redis até serem invalidados por uma escrita; no cache em memória a invalidação só
+# alcança o worker que atendeu a escrita, então neles expiram após RELATORIO_CACHE_TTL_FECHADO.
+TTL_PERIODO_ABERTO = int(os.environ.get('RELATORIO_CACHE_TTL', '60'))
+TTL_PERIODO_FECHADO_MEMORIA = int(os.environ.get('RELATORIO_CACHE_TTL_FECHADO', '300'))
+MAXIMO_ENTRADAS = int(os.environ.get('RELATORIO_CACHE_MAX', '256'))
+
+PREFIXO = 'relatorio'
+
+
+class CacheMemoria:
+    # LRU em memória do processo, com TTL por entrada (None = sem expiração)
+    compartilhado = False
+
+    def __init__(self, maximo=MAXIMO_ENTRADAS):
+        self.maximo = maximo
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada is None:
+                return None
+            valor, expira_em = entrada
+            if expira_em is not None and expira_em < time.monotonic():
+                del self._entradas[chave]
+                return None
+            self._entradas.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor, ttl=None):
+        with self._lock:
+            self._entradas[chave] = (valor, time.monotonic() + ttl if ttl else None)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def remover(self, *chaves):
+        with self._lock:
+            for chave in chaves:
+                self._entradas.pop(chave, None)
+
+    def invalidar(self, predicado):
+        with self._lock:
+            for chave in [c for c in self._entradas if predicado(c)]:
+                del self._entradas[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+
+
+class CacheRedis:
+    # Backend compartilhado entre os workers do gunicorn (requer o pacote redis)
+    compartilhado = True
+
+    def __init__(self, url, maximo=MAXIMO_ENTRADAS, prefixo=PREFIXO):
+        import redis # type: ignore
+        self.cliente = redis.Redis.from_url(url)
+        self.maximo = maximo
+        self.prefixo = prefixo
+        self.indice = f'{prefixo}:indice'
+
+    def obter(self, chave):
+        valor = self.cliente.get(f'{self.prefixo}:{chave}')
+        return json.loads(valor) if valor is not None else None
+
+    def guardar(self, chave, valor, ttl=None):
+        # O índice (sorted set por horário de gravação) permite invalidar por período e limitar o tamanho
+        pipe = self.cliente.pipeline()
+        pipe.set(f'{self.prefixo}:{chave}', json.dumps(valor), ex=ttl)
+        pipe.zadd(self.indice, {chave: time.time()})
+        pipe.execute()
+        excedentes = self.cliente.zrange(self.indice, 0, -self.maximo - 1)
+        if excedentes:
+            self._remover([c.decode('utf-8') for c in excedentes])
+
+    def remover(self, *chaves):
+        self._remover(list(chaves))
+
+    def invalidar(self, predicado):
+        chaves = [c.decode('utf-8') for c in self.cliente.zrange(self.indice, 0, -1)]
+        self._remover([c for c in chaves if predicado(c)])
+
+    def limpar(self):
+        chaves = [c.decode('utf-8') for c in self.cliente.zrange(self.indice, 0, -1)]
+        self._remover(chaves)
+
+    def _remover(self, chaves):
+        if not chaves:
+            return
+        pipe = self.cliente.pipeline()
+        pipe.delete(*(f'{self.prefixo}:{c}' for c in chaves))
+        pipe.zrem(self.indice, *chaves)
+        pipe.execute()
+
+
+def _criar_backend():
+    url = os.environ.get('RELATORIO_CACHE_URL', '')
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return CacheRedis(url)
+    return CacheMemoria()
+
+
+backend = _criar_backend()
+
+
+def _sem_fuso(data):
+    return data.replace(tzinfo=None) if data.tzinfo else data
+
+
+def chave(endpoint, data_inicio, data_fim, parametros=None):
+    # endpoint|inicio|fim|parâmetros extras ordenados
+    extras = '&'.join(f'{k}={v}' for k, v in sorted((parametros or {}).items()) if v is not None)
+    return f'{endpoint}|{_sem_fuso(data_inicio).isoformat()}|{_sem_fuso(data_fim).isoformat()}|{extras}'
+
+
+def _periodo_da_chave(chave_cache):
+    _, inicio, fim, _ = chave_cache.split('|', 3)
+    return datetime.fromisoformat(inicio), datetime.fromisoformat(fim)
+
+
+def periodo_fechado(data_fim):
+    hoje = date.today()
+    return _sem_fuso(data_fim) < datetime(hoje.year, hoje.month, hoje.day)
+
+
+def obter_ou_calcular(endpoint, data_inicio, data_fim, parametros, calcular):
+    # Devolve (resultado, veio_do_cache)
+    chave_cache = chave(endpoint, data_inicio, data_fim, parametros)
+    resultado = backend.obter(chave_cache)
+    if resultado is not None:
+        return resultado, True
+
+    resultado = calcular()
+    if not periodo_fechado(data_fim):
+        ttl = TTL_PERIODO_ABERTO
+    else:
+        ttl = None if backend.compartilhado else TTL_PERIODO_FECHADO_MEMORIA
+    backend.guardar(chave_cache, resultado, ttl)
+    return resultado, False
+
+
+def invalidar(inicio, fim=None):
+    # Remove os resultados cujo período cruza [inicio, fim] (data_criacao das entregas alteradas;
+    # sem fim, só a data inicio)
+    if inicio is None:
+        return
+    inicio = _sem_fuso(inicio)
+    fim = _sem_fuso(fim) if fim is not None else inicio
+
+    def afetada(chave_cache):
+        periodo_inicio, periodo_fim = _periodo_da_chave(chave_cache)
+        return periodo_inicio <= fim and periodo_fim >= inicio
+
+    backend.invalidar(afetada)
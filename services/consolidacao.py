@@ -0,0 +1,138 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import case, func, literal_column, select # type: ignore
+from sqlalchemy.dialects import postgresql, sqlite # type: ignore
+from models.models import db, Entrega, KpiDiario
+from services.relatorios import contar, dialeto, NO_PRAZO, ATRASADA
+
+# A reconstrução agrupa as entregas em janelas de dias para limitar a memória
+DIAS_POR_JANELA = 31
+# Entregas por comando nas atualizações incrementais (IN (...))
+BLOCO = 1000
+
+# Colunas somadas em cada linha da consolidação
+METRICAS = ('total', 'no_prazo', 'atrasadas', 'km', 'peso', 'preco')
+
+
+def _como_data(valor):
+    # func.date() devolve date no Postgres e string no SQLite
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor))
+
+
+def _linhas_consolidadas(data_inicio, data_fim):
+    # Agrupa as entregas de [data_inicio, data_fim) por dia, status, motorista e região
+    dia = func.date(Entrega.data_criacao)
+    consulta = db.session.query(
+        dia,
+        Entrega.status,
+        Entrega.motorista_id,
+        Entrega.regiao,
+        func.count(Entrega.id),
+        contar(NO_PRAZO),
+        contar(ATRASADA),
+        func.sum(Entrega.km),
+        func.sum(Entrega.peso),
+        func.sum(Entrega.preco)
+    ).filter(
+        Entrega.data_criacao >= data_inicio,
+        Entrega.data_criacao < data_fim
+    ).group_by(dia, Entrega.status, Entrega.motorista_id, Entrega.regiao)
+
+    return [
+        {
+            'dia': _como_data(d), 'status': status, 'motorista_id': motorista_id, 'regiao': regiao,
+            'total': total, 'no_prazo': int(no_prazo), 'atrasadas': int(atrasadas), 'km': km, 'peso': peso, 'preco': preco
+        }
+        for d, status, motorista_id, regiao, total, no_prazo, atrasadas, km, peso, preco in consulta
+    ]
+
+
+def _somar_contribuicao(ids, sinal):
+    # Soma (+1) ou subtrai (-1) o estado atual das entregas `ids` nas linhas (dia, status, motorista,
+    # região) correspondentes: INSERT ... SELECT agrupado com ON CONFLICT DO UPDATE, sem reler o dia
+    dia = func.date(Entrega.data_criacao)
+    selecao = select(
+        dia,
+        Entrega.status,
+        Entrega.motorista_id,
+        Entrega.regiao,
+        func.count(Entrega.id) * sinal,
+        contar(NO_PRAZO) * sinal,
+        contar(ATRASADA) * sinal,
+        func.sum(Entrega.km) * sinal,
+        func.sum(Entrega.peso) * sinal,
+        func.sum(Entrega.preco) * sinal
+    ).where(Entrega.id.in_(ids)).group_by(dia, Entrega.status, Entrega.motorista_id, Entrega.regiao)
+
+    insert = postgresql.insert if dialeto() == 'postgresql' else sqlite.insert
+    comando = insert(KpiDiario).from_select(('dia', 'status', 'motorista_id', 'regiao') + METRICAS, selecao)
+    novos = comando.excluded
+    somas = {campo: getattr(KpiDiario, campo) + getattr(novos, campo) for campo in ('total', 'no_prazo', 'atrasadas')}
+    # km/peso/preco nulos não alteram a soma (como no SUM da reconstrução)
+    somas.update({
+        campo: case(
+            (getattr(novos, campo).is_(None), getattr(KpiDiario, campo)),
+            else_=func.coalesce(getattr(KpiDiario, campo), 0) + getattr(novos, campo)
+        )
+        for campo in ('km', 'peso', 'preco')
+    })
+    db.session.execute(comando.on_conflict_do_update(
+        # Índice único ux_kpis_diarios_chave (motorista nulo conta como 0)
+        index_elements=[KpiDiario.dia, KpiDiario.status, func.coalesce(KpiDiario.motorista_id, literal_column('0')), KpiDiario.regiao],
+        set_=somas
+    ))
+
+
+def _blocos(ids):
+    ids = sorted(set(ids))
+    for i in range(0, len(ids), BLOCO):
+        yield ids[i:i + BLOCO]
+
+
+def retirar(ids):
+    # Antes de alterar entregas existentes: tira o estado atual delas da consolidação.
+    # As linhas ficam bloqueadas (FOR UPDATE, Postgres) até o fim da transação, então escritas
+    # concorrentes na mesma entrega não retiram o mesmo estado duas vezes.
+    # Não faz commit: a escrita e a consolidação são confirmadas juntas.
+    for bloco in _blocos(ids):
+        if dialeto() == 'postgresql':
+            db.session.execute(select(Entrega.id).where(Entrega.id.in_(bloco)).order_by(Entrega.id).with_for_update())
+        _somar_contribuicao(bloco, -1)
+
+
+def incluir(ids):
+    # Depois de criar ou alterar entregas (já com flush): soma o novo estado delas na consolidação.
+    # Linhas que chegam a total 0 ficam na tabela e são ignoradas pelos relatórios.
+    for bloco in _blocos(ids):
+        _somar_contribuicao(bloco, 1)
+
+
+def reconstruir(data_inicio=None, data_fim=None):
+    # Reconstrói a consolidação de [data_inicio, data_fim] (dias inteiros).
+    # Sem datas, reconstrói todo o histórico de entregas.
+    if data_inicio is None or data_fim is None:
+        primeira, ultima = db.session.query(func.min(Entrega.data_criacao), func.max(Entrega.data_criacao)).one()
+        if primeira is None:
+            return 0
+        data_inicio = data_inicio or primeira
+        data_fim = data_fim or ultima
+
+    dia_inicio, dia_fim = _como_data(data_inicio), _como_data(data_fim)
+    KpiDiario.query.filter(KpiDiario.dia >= dia_inicio, KpiDiario.dia <= dia_fim).delete(synchronize_session=False)
+
+    total_linhas = 0
+    inicio = datetime(dia_inicio.year, dia_inicio.month, dia_inicio.day)
+    fim = datetime(dia_fim.year, dia_fim.month, dia_fim.day) + timedelta(days=1)
+    while inicio < fim:
+        proximo = min(inicio + timedelta(days=DIAS_POR_JANELA), fim)
+        linhas = _linhas_consolidadas(inicio, proximo)
+        if linhas:
+            db.session.bulk_insert_mappings(KpiDiario, linhas)
+        total_linhas += len(linhas)
+        inicio = proximo
+
+    db.session.commit()
+    return total_linhas
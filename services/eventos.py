@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+from sqlalchemy import create_engine, text # type: ignore
+from sqlalchemy.pool import NullPool # type: ignore
+from models.models import db, Entrega, AtualizacaoStatus
+from services import metricas
+from services.relatorios import dialeto
+from services.transacao import apos_commit
+
+# Canal de eventos de status (atualizações de histórico) para os painéis ao vivo.
+# No Postgres os eventos saem com NOTIFY dentro da transação da escrita, então só chegam
+# depois do commit e alcançam todos os workers (cada um com uma thread em LISTEN).
+# Nos demais bancos (SQLite no desenvolvimento) a distribuição é só no próprio processo.
+CANAL = 'eventos_status'
+
+# Cada stream aberto ocupa uma thread do worker (gthread) enquanto durar: o limite de assinantes
+# por worker (bem abaixo de GUNICORN_THREADS) deixa threads livres para o restante da API
+MAXIMO_ASSINANTES = int(os.environ.get('EVENTOS_MAXIMO_ASSINANTES', '8'))
+
+# Eventos pendentes por assinante; um assinante que não consome é desconectado
+# (o cliente reconecta com Last-Event-ID e recupera o que perdeu)
+MAXIMO_PENDENTES = 1000
+# Eventos devolvidos, no máximo, ao retomar uma conexão com Last-Event-ID
+MAXIMO_RETOMADA = 1000
+# O Postgres recusa payloads de NOTIFY com 8000 bytes ou mais (e a escrita inteira seria desfeita):
+# acima deste limite o evento vai sem os campos de texto livre, marcado como "resumido"
+LIMITE_PAYLOAD = 7000
+CAMPOS_TEXTO = ('localizacao', 'observacoes', 'motivo_atraso', 'motivo_devolucao')
+
+logger = logging.getLogger(__name__)
+
+_assinantes = {}
+_lock = threading.Lock()
+_ouvinte = None
+
+
+def evento(atualizacao, entrega):
+    return {
+        'id': atualizacao.id,
+        'entrega_id': entrega.id,
+        'codigo_rastreio': entrega.codigo_rastreio,
+        'motorista_id': entrega.motorista_id,
+        'status': atualizacao.status,
+        'timestamp': atualizacao.timestamp.isoformat() if atualizacao.timestamp else None,
+        'localizacao': atualizacao.localizacao,
+        'observacoes': atualizacao.observacoes,
+        'motivo_atraso': atualizacao.motivo_atraso,
+        'motivo_devolucao': atualizacao.motivo_devolucao
+    }
+
+
+def _payload(e):
+    # JSON do evento para o NOTIFY, sempre abaixo do limite do Postgres (json.dumps gera só ASCII)
+    payload = json.dumps(e)
+    if len(payload) < LIMITE_PAYLOAD:
+        return payload
+    resumido = {campo: valor for campo, valor in e.items() if campo not in CAMPOS_TEXTO}
+    resumido['resumido'] = True
+    return json.dumps(resumido)
+
+
+def publicar(eventos):
+    # Chamado dentro da transação da escrita, depois do flush (os eventos já têm id)
+    eventos = [e for e in eventos if e]
+    if not eventos:
+        return
+    apos_commit(metricas.registrar_transicoes, [e['status'] for e in eventos])
+    if dialeto() == 'postgresql':
+        db.session.execute(
+            text('SELECT pg_notify(:canal, e) FROM unnest(CAST(:eventos AS text[])) AS e'),
+            {'canal': CANAL, 'eventos': [_payload(e) for e in eventos]}
+        )
+    else:
+        apos_commit(_distribuir, eventos)
+
+
+def _aceita(filtros, e):
+    if filtros.get('motorista_id') is not None and e['motorista_id'] != filtros['motorista_id']:
+        return False
+    if filtros.get('status') and e['status'] not in filtros['status']:
+        return False
+    if filtros.get('codigo_rastreio') and e['codigo_rastreio'] not in filtros['codigo_rastreio']:
+        return False
+    return True
+
+
+def _distribuir(eventos):
+    with _lock:
+        assinantes = list(_assinantes.items())
+    for fila, filtros in assinantes:
+        for e in eventos:
+            if not _aceita(filtros, e):
+                continue
+            try:
+                fila.put_nowait(e)
+            except queue.Full:
+                # Assinante lento: encerra o stream (None) em vez de acumular memória
+                cancelar(fila)
+                fila.queue.clear()
+                fila.put_nowait(None)
+                break
+
+
+def assinar(app, filtros):
+    # Registra um assinante com filtros {motorista_id, status, codigo_rastreio}; devolve a fila de eventos,
+    # ou None se o worker já atende MAXIMO_ASSINANTES streams
+    if dialeto() == 'postgresql':
+        _iniciar_ouvinte(app)
+    fila = queue.Queue(maxsize=MAXIMO_PENDENTES)
+    with _lock:
+        if len(_assinantes) >= MAXIMO_ASSINANTES:
+            return None
+        _assinantes[fila] = filtros
+    return fila
+
+
+def cancelar(fila):
+    with _lock:
+        _assinantes.pop(fila, None)
+
+
+def desde(ultimo_id, filtros):
+    # Eventos gravados depois de ultimo_id (retomada de conexão), em ordem
+    consulta = db.session.query(AtualizacaoStatus, Entrega).join(
+        Entrega, Entrega.id == AtualizacaoStatus.entrega_id
+    ).filter(AtualizacaoStatus.id > ultimo_id)
+    if filtros.get('motorista_id') is not None:
+        consulta = consulta.filter(Entrega.motorista_id == filtros['motorista_id'])
+    if filtros.get('status'):
+        consulta = consulta.filter(AtualizacaoStatus.status.in_(filtros['status']))
+    if filtros.get('codigo_rastreio'):
+        consulta = consulta.filter(Entrega.codigo_rastreio.in_(filtros['codigo_rastreio']))
+    consulta = consulta.order_by(AtualizacaoStatus.id).limit(MAXIMO_RETOMADA)
+    return [evento(atualizacao, entrega) for atualizacao, entrega in consulta]
+
+
+def _iniciar_ouvinte(app):
+    global _ouvinte
+    with _lock:
+        if _ouvinte is not None and _ouvinte.is_alive():
+            return
+        _ouvinte = threading.Thread(target=_escutar, args=(app,), name='eventos-status', daemon=True)
+        _ouvinte.start()
+
+
+def _escutar(app):
+    # LISTEN em uma conexão dedicada (fora do pool), reconectando em caso de falha.
+    # Atrás do PgBouncer em modo transação o LISTEN não funciona: DATABASE_URL_DIRETA
+    # aponta para o Postgres sem passar pelo PgBouncer.
+    if os.environ.get('DATABASE_URL_DIRETA'):
+        engine = create_engine(os.environ['DATABASE_URL_DIRETA'], poolclass=NullPool)
+    else:
+        with app.app_context():
+            engine = db.engine
+    while True:
+        driver = None
+        try:
+            conexao = engine.raw_connection()
+            driver = conexao.driver_connection
+            conexao.detach()
+            driver.autocommit = True
+            with driver.cursor() as cursor:
+                cursor.execute(f'LISTEN {CANAL}')
+            while True:
+                if select.select([driver], [], [], 30) == ([], [], []):
+                    continue
+                driver.poll()
+                eventos = []
+                while driver.notifies:
+                    eventos.append(json.loads(driver.notifies.pop(0).payload))
+                if eventos:
+                    _distribuir(eventos)
+        except Exception as e:
+            logger.error(f'Erro no canal de eventos de status: {str(e)}')
+            if driver is not None:
+                try:
+                    driver.close()
+                except Exception:
+                    pass
+            time.sleep(5)
+
+
+def formatar_sse(e):
+    return f"id: {e['id']}\nevent: status\ndata: {json.dumps(e)}\n\n"
@@ -0,0 +1,92 @@
+import csv
+import io
+import tempfile
+from openpyxl import Workbook # type: ignore
+from models.models import db, Entrega, AtualizacaoStatus
+from services import relatorios
+
+# Linhas buscadas por vez do cursor no servidor
+LOTE = 1000
+
+COLUNAS_ENTREGAS = ('codigo_rastreio', 'remetente', 'destinatario', 'origem', 'destino', 'status',
+                    'data_criacao', 'data_atualizacao', 'data_prevista_entrega', 'motorista_id',
+                    'motivo_atraso', 'motivo_devolucao', 'km', 'peso', 'preco')
+COLUNAS_HISTORICO = ('codigo_rastreio', 'status', 'timestamp', 'observacoes')
+COLUNAS_RESUMO = ('indicador', 'valor')
+
+# Planilhas do relatório, na ordem em que aparecem no arquivo
+PLANILHAS = ('entregas', 'historico', 'resumo')
+
+
+def _entregas(data_inicio, data_fim):
+    return db.session.query(*(getattr(Entrega, c) for c in COLUNAS_ENTREGAS)).filter(
+        relatorios.filtro_periodo(data_inicio, data_fim)
+    ).order_by(Entrega.data_criacao, Entrega.id).execution_options(yield_per=LOTE)
+
+
+def _historico(data_inicio, data_fim):
+    return db.session.query(
+        Entrega.codigo_rastreio,
+        AtualizacaoStatus.status,
+        AtualizacaoStatus.timestamp,
+        AtualizacaoStatus.observacoes
+    ).join(
+        Entrega, Entrega.id == AtualizacaoStatus.entrega_id
+    ).filter(
+        relatorios.filtro_periodo(data_inicio, data_fim)
+    ).order_by(AtualizacaoStatus.entrega_id, AtualizacaoStatus.timestamp).execution_options(yield_per=LOTE)
+
+
+def _resumo(data_inicio, data_fim, usar_consolidacao=False):
+    # KPIs do relatório de desempenho, um indicador por linha
+    desempenho = relatorios.relatorio_desempenho(data_inicio, data_fim, usar_consolidacao=usar_consolidacao)
+    yield ('periodo_inicio', data_inicio.isoformat())
+    yield ('periodo_fim', data_fim.isoformat())
+    for grupo in ('kpis_gerais', 'kpis_avancados'):
+        for chave, valor in desempenho[grupo].items():
+            if isinstance(valor, dict):
+                for subchave, subvalor in valor.items():
+                    yield (f'{chave}_{subchave}', subvalor)
+            else:
+                yield (chave, valor)
+
+
+def linhas(planilha, data_inicio, data_fim, usar_consolidacao=False):
+    # Cabeçalho e linhas de uma planilha, lidas do banco em lotes
+    if planilha == 'entregas':
+        return COLUNAS_ENTREGAS, _entregas(data_inicio, data_fim)
+    if planilha == 'historico':
+        return COLUNAS_HISTORICO, _historico(data_inicio, data_fim)
+    return COLUNAS_RESUMO, _resumo(data_inicio, data_fim, usar_consolidacao)
+
+
+def gerar_csv(planilha, data_inicio, data_fim, usar_consolidacao=False):
+    # Gera o CSV de uma planilha em partes, sem montar o arquivo em memória
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    cabecalho, dados = linhas(planilha, data_inicio, data_fim, usar_consolidacao)
+    escritor.writerow(cabecalho)
+    for i, linha in enumerate(dados, 1):
+        escritor.writerow(linha)
+        if i % LOTE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def gerar_xlsx(data_inicio, data_fim, usar_consolidacao=False, arquivo=None):
+    # Monta o XLSX com as três planilhas em `arquivo` (por padrão, um arquivo temporário em disco).
+    # O workbook write-only grava cada linha direto no arquivo, sem manter as células em memória.
+    workbook = Workbook(write_only=True)
+    for planilha in PLANILHAS:
+        sheet = workbook.create_sheet(title=planilha)
+        cabecalho, dados = linhas(planilha, data_inicio, data_fim, usar_consolidacao)
+        sheet.append(cabecalho)
+        for linha in dados:
+            sheet.append(tuple(linha))
+
+    arquivo = arquivo or tempfile.TemporaryFile()
+    workbook.save(arquivo)
+    arquivo.seek(0)
+    return arquivo
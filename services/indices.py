@@ -0,0 +1,60 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, text, tuple_ # type: ignore
+from models.models import db, Entrega, AtualizacaoStatus
+
+
+def explicar(consulta, sessao=None):
+    # Plano do Postgres (EXPLAIN FORMAT JSON) para uma Query ou select(), sem executá-la
+    conexao = (sessao or db.session).connection()
+    declaracao = consulta.statement if hasattr(consulta, 'statement') else consulta
+    compilada = declaracao.compile(dialect=conexao.dialect, compile_kwargs={'render_postcompile': True})
+    return conexao.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + str(compilada), compilada.params).scalar()
+
+
+def consultas_criticas():
+    # Consultas dos caminhos mais usados da API, com parâmetros representativos
+    fim = datetime.now()
+    inicio = fim - timedelta(days=30)
+    periodo = (Entrega.data_criacao >= inicio, Entrega.data_criacao <= fim)
+    return {
+        'relatorio_por_periodo': db.session.query(func.count(Entrega.id)).filter(*periodo),
+        'relatorio_por_status': db.session.query(func.count(Entrega.id)).filter(Entrega.status == 'Entregue', *periodo),
+        'relatorio_por_motorista': db.session.query(func.count(Entrega.id)).filter(Entrega.motorista_id == 1, *periodo),
+        'rastreio': db.session.query(Entrega).filter(Entrega.codigo_rastreio == 'XX000000000BR'),
+        'historico_entrega': db.session.query(AtualizacaoStatus).filter(
+            AtualizacaoStatus.entrega_id == 1
+        ).order_by(AtualizacaoStatus.timestamp),
+        'listagem_paginada': db.session.query(Entrega.id, Entrega.data_criacao).filter(
+            tuple_(Entrega.data_criacao, Entrega.id) < tuple_(fim, 2 ** 31 - 1)
+        ).order_by(Entrega.data_criacao.desc(), Entrega.id.desc()).limit(100),
+        # Busca por trecho (índice de trigramas em termos_busca)
+        'busca_entregas': db.session.query(Entrega.id).filter(Entrega.termos_busca.like('%recife%'))
+    }
+
+
+def _varreduras_sequenciais(no):
+    # Tabelas lidas por Seq Scan em qualquer ponto do plano
+    if no.get('Node Type') == 'Seq Scan':
+        yield no.get('Relation Name')
+    for filho in no.get('Plans', []):
+        yield from _varreduras_sequenciais(filho)
+
+
+def verificar():
+    # Devolve {consulta: [tabelas com Seq Scan]} para as consultas críticas sem índice adequado.
+    # enable_seqscan = off faz o planejador preferir qualquer índice utilizável mesmo em
+    # tabelas pequenas: se ainda assim sobrar um Seq Scan, falta índice para a consulta.
+    if db.session.get_bind().dialect.name != 'postgresql':
+        raise RuntimeError('A verificação de índices requer Postgres')
+
+    problemas = {}
+    try:
+        db.session.execute(text('SET LOCAL enable_seqscan = off'))
+        for nome, consulta in consultas_criticas().items():
+            plano = explicar(consulta)
+            tabelas = sorted(set(_varreduras_sequenciais(plano[0]['Plan'])))
+            if tabelas:
+                problemas[nome] = tabelas
+    finally:
+        db.session.rollback()
+    return problemas
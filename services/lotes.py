@@ -0,0 +1,315 @@
+import csv
+import io
+import json
+from datetime import datetime, timezone
+from sqlalchemy import func, insert, select, update # type: ignore
+from models.models import db, Entrega, AtualizacaoStatus, Usuario, regiao_destino
+from services import eventos, busca
+
+# Máximo de registros aceitos por requisição de lote
+LIMITE_LOTE = 10000
+# Tamanho dos blocos das consultas com IN (...) e dos INSERTs em lote
+BLOCO = 1000
+
+CAMPOS_OBRIGATORIOS = ('codigo_rastreio', 'remetente', 'destinatario', 'origem', 'destino')
+
+
+def ler_registros(request, chave='entregas'):
+    # Lê o lote do corpo da requisição: array JSON (ou {<chave>: [...]}), NDJSON ou CSV
+    # (corpo text/csv ou arquivo enviado no campo "arquivo"). Lança ValueError se o formato for inválido.
+    arquivo = request.files.get('arquivo')
+    if arquivo is not None:
+        conteudo = arquivo.stream.read().decode('utf-8-sig')
+        tipo = 'ndjson' if (arquivo.filename or '').endswith(('.ndjson', '.jsonl')) else 'csv'
+    else:
+        conteudo = request.get_data(as_text=True)
+        tipo = request.mimetype
+
+    if tipo in ('csv', 'text/csv'):
+        # Células vazias do CSV equivalem a campos ausentes
+        leitor = csv.DictReader(io.StringIO(conteudo))
+        registros = [{k: v for k, v in linha.items() if k and v not in (None, '')} for linha in leitor]
+    elif tipo in ('ndjson', 'application/x-ndjson', 'application/jsonl'):
+        try:
+            registros = [json.loads(linha) for linha in conteudo.splitlines() if linha.strip()]
+        except json.JSONDecodeError as e:
+            raise ValueError(f'NDJSON inválido: {e}')
+    else:
+        try:
+            registros = json.loads(conteudo)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'JSON inválido: {e}')
+        if isinstance(registros, dict):
+            registros = registros.get(chave)
+
+    if not isinstance(registros, list) or not all(isinstance(r, dict) for r in registros):
+        raise ValueError('O lote deve ser uma lista de objetos')
+    if len(registros) > LIMITE_LOTE:
+        raise ValueError(f'Lote excede o limite de {LIMITE_LOTE} registros')
+    return registros
+
+
+def _blocos(valores):
+    valores = list(valores)
+    for i in range(0, len(valores), BLOCO):
+        yield valores[i:i + BLOCO]
+
+
+def _codigos_existentes(codigos):
+    existentes = set()
+    for bloco in _blocos(codigos):
+        existentes.update(c for c, in db.session.query(Entrega.codigo_rastreio).filter(Entrega.codigo_rastreio.in_(bloco)))
+    return existentes
+
+
+def _motoristas_validos(ids):
+    validos = set()
+    for bloco in _blocos(ids):
+        validos.update(i for i, in db.session.query(Usuario.id).filter(Usuario.id.in_(bloco), Usuario.perfil == 'motorista'))
+    return validos
+
+
+def _verificar_tamanho(tabela, coluna, valor, campo=None):
+    # Um valor maior que a coluna derrubaria o INSERT em lote inteiro (Postgres): vira erro da linha
+    tamanho = tabela.c[coluna].type.length
+    if valor is not None and len(valor) > tamanho:
+        raise ValueError(f'{campo or coluna} excede {tamanho} caracteres')
+
+
+def _data_utc(valor):
+    # ISO 8601; com fuso, convertida para UTC antes de virar datetime sem fuso (colunas DateTime)
+    try:
+        data = datetime.fromisoformat(str(valor).replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('Formato de data inválido. Use ISO 8601 (YYYY-MM-DDTHH:MM:SS)')
+    if data.tzinfo:
+        data = data.astimezone(timezone.utc).replace(tzinfo=None)
+    return data
+
+
+def _validar(registro, agora):
+    # Converte um registro em linha de Entrega; lança ValueError com a mensagem do erro
+    if not all(registro.get(campo) for campo in CAMPOS_OBRIGATORIOS):
+        raise ValueError('Dados incompletos')
+
+    linha = {campo: str(registro[campo]) for campo in CAMPOS_OBRIGATORIOS}
+    for campo in CAMPOS_OBRIGATORIOS:
+        _verificar_tamanho(Entrega.__table__, campo, linha[campo])
+    linha.update(status='Registrado', data_criacao=agora, data_atualizacao=agora,
+                 data_prevista_entrega=None, motorista_id=None)
+    # O INSERT em lote não passa pelos eventos do ORM que preenchem a busca e a região
+    linha['termos_busca'] = busca.termos(linha)
+    linha['regiao'] = regiao_destino(linha['destino'])
+
+    if registro.get('data_prevista_entrega'):
+        linha['data_prevista_entrega'] = _data_utc(registro['data_prevista_entrega'])
+
+    if registro.get('motorista_id'):
+        try:
+            linha['motorista_id'] = int(registro['motorista_id'])
+        except (TypeError, ValueError):
+            raise ValueError('Motorista não encontrado ou inválido')
+    return linha
+
+
+def criar_entregas(registros):
+    # Valida o lote com consultas por conjunto (códigos já cadastrados e motoristas) e insere
+    # as entregas válidas e suas atualizações 'Registrado' com INSERTs em lote.
+    # Não faz commit: a rota confirma tudo em uma única transação.
+    # Devolve (criadas, erros), com criadas = [(id, codigo_rastreio)] e erros = [{'linha', 'codigo_rastreio', 'error'}].
+    agora = datetime.utcnow()
+    erros = []
+    linhas = []
+    vistos = set()
+    for i, registro in enumerate(registros, 1):
+        try:
+            linha = _validar(registro, agora)
+        except ValueError as e:
+            erros.append({'linha': i, 'codigo_rastreio': registro.get('codigo_rastreio'), 'error': str(e)})
+            continue
+        if linha['codigo_rastreio'] in vistos:
+            erros.append({'linha': i, 'codigo_rastreio': linha['codigo_rastreio'], 'error': 'Código de rastreio repetido no lote'})
+            continue
+        vistos.add(linha['codigo_rastreio'])
+        linhas.append((i, linha))
+
+    existentes = _codigos_existentes(vistos)
+    motoristas = _motoristas_validos({l['motorista_id'] for _, l in linhas if l['motorista_id'] is not None})
+
+    validas = []
+    for i, linha in linhas:
+        if linha['codigo_rastreio'] in existentes:
+            erros.append({'linha': i, 'codigo_rastreio': linha['codigo_rastreio'], 'error': 'Código de rastreio já existe'})
+        elif linha['motorista_id'] is not None and linha['motorista_id'] not in motoristas:
+            erros.append({'linha': i, 'codigo_rastreio': linha['codigo_rastreio'], 'error': 'Motorista não encontrado ou inválido'})
+        else:
+            validas.append(linha)
+    erros.sort(key=lambda erro: erro['linha'])
+
+    criadas = []
+    for bloco in _blocos(validas):
+        resultado = db.session.execute(
+            # RETURNING traz o código junto do id: a ordem das linhas devolvidas não importa.
+            # render_nulls mantém os NULLs no INSERT, para que linhas com e sem motorista/data
+            # prevista não sejam separadas em vários comandos.
+            insert(Entrega).returning(Entrega.id, Entrega.codigo_rastreio, Entrega.motorista_id),
+            bloco,
+            execution_options={'render_nulls': True}
+        )
+        ids = {linha.id: linha for linha in resultado}
+        historico = db.session.scalars(insert(AtualizacaoStatus).returning(AtualizacaoStatus), [
+            {
+                'entrega_id': id,
+                'status': 'Registrado',
+                'timestamp': agora,
+                'observacoes': 'Entrega registrada no sistema'
+            }
+            for id in ids
+        ])
+        eventos.publicar([eventos.evento(atualizacao, ids[atualizacao.entrega_id]) for atualizacao in historico])
+        criadas.extend((linha.id, linha.codigo_rastreio) for linha in ids.values())
+
+    return criadas, erros
+
+
+def _validar_evento(registro, agora):
+    # Normaliza um evento de status; lança ValueError com a mensagem do erro
+    if not registro.get('codigo_rastreio') or not registro.get('status'):
+        raise ValueError('Código de rastreio e status são obrigatórios')
+
+    evento = {
+        'codigo_rastreio': str(registro['codigo_rastreio']),
+        'status': str(registro['status']),
+        'motivo': str(registro['motivo']) if registro.get('motivo') else None,
+        'observacoes': registro.get('observacoes', ''),
+        'localizacao': str(registro['localizacao']) if registro.get('localizacao') else None,
+        'chave_idempotencia': str(registro['chave_idempotencia']) if registro.get('chave_idempotencia') else None,
+        'timestamp': agora
+    }
+    if registro.get('timestamp'):
+        evento['timestamp'] = _data_utc(registro['timestamp'])
+
+    tabela = AtualizacaoStatus.__table__
+    _verificar_tamanho(tabela, 'status', evento['status'])
+    _verificar_tamanho(tabela, 'localizacao', evento['localizacao'])
+    _verificar_tamanho(tabela, 'motivo_atraso', evento['motivo'], 'motivo')
+    _verificar_tamanho(tabela, 'chave_idempotencia', evento['chave_idempotencia'])
+    return evento
+
+
+def _chaves_existentes(chaves):
+    existentes = set()
+    for bloco in _blocos(chaves):
+        existentes.update(c for c, in db.session.query(AtualizacaoStatus.chave_idempotencia).filter(
+            AtualizacaoStatus.chave_idempotencia.in_(bloco)
+        ))
+    return existentes
+
+
+def _entregas_por_codigo(codigos):
+    # Com o timestamp do evento mais recente já gravado (índice entrega_id, timestamp)
+    ultimo_evento = select(func.max(AtualizacaoStatus.timestamp)).where(
+        AtualizacaoStatus.entrega_id == Entrega.id
+    ).scalar_subquery()
+    entregas = {}
+    for bloco in _blocos(codigos):
+        for linha in db.session.query(
+            Entrega.id, Entrega.codigo_rastreio, Entrega.data_criacao, Entrega.motorista_id,
+            Entrega.motivo_atraso, Entrega.motivo_devolucao, ultimo_evento.label('ultimo_evento')
+        ).filter(Entrega.codigo_rastreio.in_(bloco)):
+            entregas[linha.codigo_rastreio] = linha
+    return entregas
+
+
+def atualizar_status(registros, antes_de_alterar=None):
+    # Aplica um lote de eventos de status (leituras dos coletores nos centros de distribuição).
+    # Os códigos são resolvidos por conjunto, os eventos entram com um INSERT em lote e cada entrega
+    # recebe um único UPDATE (em lote) com o estado do seu evento mais recente, com as mesmas regras
+    # de add_status. Eventos cuja chave_idempotencia já foi gravada são ignorados (reenvios).
+    # Eventos mais antigos que o último histórico da entrega (reenvios atrasados) entram no histórico,
+    # mas não alteram o status atual. Timestamps em UTC sem fuso, como os convertidos por _data_utc.
+    # antes_de_alterar(*ids) é chamado com as entregas cujo status muda, antes de qualquer escrita.
+    # Não faz commit. Devolve (aplicados, duplicados, erros, entregas, atualizadas), com entregas =
+    # linhas (id, codigo_rastreio, data_criacao, ...) das entregas com eventos novos no histórico e
+    # atualizadas = ids das que tiveram o status alterado.
+    agora = datetime.utcnow()
+    erros = []
+    duplicados = []
+    pendentes = []
+    chaves = set()
+    for i, registro in enumerate(registros, 1):
+        try:
+            evento = _validar_evento(registro, agora)
+        except ValueError as e:
+            erros.append({'linha': i, 'codigo_rastreio': registro.get('codigo_rastreio'), 'error': str(e)})
+            continue
+        chave = evento['chave_idempotencia']
+        if chave is not None and chave in chaves:
+            duplicados.append({'linha': i, 'codigo_rastreio': evento['codigo_rastreio'], 'chave_idempotencia': chave})
+            continue
+        if chave is not None:
+            chaves.add(chave)
+        pendentes.append((i, evento))
+
+    ja_gravadas = _chaves_existentes(chaves)
+    entregas = _entregas_por_codigo({e['codigo_rastreio'] for _, e in pendentes})
+
+    validos = []
+    for i, evento in pendentes:
+        if evento['chave_idempotencia'] in ja_gravadas:
+            duplicados.append({'linha': i, 'codigo_rastreio': evento['codigo_rastreio'], 'chave_idempotencia': evento['chave_idempotencia']})
+        elif evento['codigo_rastreio'] not in entregas:
+            erros.append({'linha': i, 'codigo_rastreio': evento['codigo_rastreio'], 'error': 'Entrega não encontrada'})
+        else:
+            validos.append(evento)
+    erros.sort(key=lambda erro: erro['linha'])
+    duplicados.sort(key=lambda duplicado: duplicado['linha'])
+
+    # Estado final de cada entrega: eventos aplicados em ordem cronológica, como chamadas a add_status
+    estados = {}
+    linhas_status = []
+    for evento in sorted(validos, key=lambda e: e['timestamp']):
+        entrega = entregas[evento['codigo_rastreio']]
+        if entrega.ultimo_evento is None or evento['timestamp'] >= entrega.ultimo_evento:
+            estado = estados.setdefault(entrega.id, {
+                'id': entrega.id,
+                'motivo_atraso': entrega.motivo_atraso,
+                'motivo_devolucao': entrega.motivo_devolucao
+            })
+            estado['status'] = evento['status']
+            estado['data_atualizacao'] = agora
+        else:
+            # Mais antigo que o estado gravado: só histórico
+            estado = {}
+
+        linha = {
+            'entrega_id': entrega.id,
+            'status': evento['status'],
+            'timestamp': evento['timestamp'],
+            'observacoes': evento['observacoes'],
+            'localizacao': evento['localizacao'],
+            'motivo_atraso': None,
+            'motivo_devolucao': None,
+            'chave_idempotencia': evento['chave_idempotencia']
+        }
+        if evento['status'] == 'Atrasado' and evento['motivo']:
+            estado['motivo_atraso'] = linha['motivo_atraso'] = evento['motivo']
+        elif evento['status'] == 'Devolvido' and evento['motivo']:
+            estado['motivo_devolucao'] = linha['motivo_devolucao'] = evento['motivo']
+        linhas_status.append(linha)
+
+    if antes_de_alterar is not None and estados:
+        antes_de_alterar(*estados)
+    por_id = {linha.id: linha for linha in entregas.values()}
+    for bloco in _blocos(linhas_status):
+        historico = db.session.scalars(
+            insert(AtualizacaoStatus).returning(AtualizacaoStatus), bloco, execution_options={'render_nulls': True}
+        )
+        eventos.publicar([eventos.evento(atualizacao, por_id[atualizacao.entrega_id]) for atualizacao in historico])
+    # UPDATE em lote por chave primária (executemany)
+    for bloco in _blocos(estados.values()):
+        db.session.execute(update(Entrega), bloco)
+
+    com_historico = {linha['entrega_id'] for linha in linhas_status}
+    alteradas = [linha for linha in entregas.values() if linha.id in com_historico]
+    return len(linhas_status), duplicados, erros, alteradas, list(estados)
@@ -0,0 +1,128 @@
+import os
+import time
+from flask import g, request # type: ignore
+from flask.signals import got_request_exception # type: ignore
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, # type: ignore
+                               CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+
+# Métricas no formato Prometheus (GET /metrics).
+# Com vários workers do gunicorn cada processo grava suas métricas em arquivos no diretório
+# PROMETHEUS_MULTIPROC_DIR (definido em gunicorn.conf.py) e o /metrics de qualquer worker
+# soma os de todos. A variável precisa existir antes de importar prometheus_client; sem ela
+# (flask run, um único processo) as métricas ficam só na memória do processo.
+MULTIPROCESSO = bool(os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+
+# Faixas de latência em segundos
+FAIXAS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+DURACAO_REQUISICAO = Histogram(
+    'http_requisicao_duracao_segundos', 'Latência das requisições HTTP',
+    ['grupo', 'metodo', 'rota'], buckets=FAIXAS_LATENCIA
+)
+REQUISICOES = Counter(
+    'http_requisicoes_total', 'Requisições HTTP atendidas',
+    ['grupo', 'metodo', 'rota', 'status']
+)
+EXCECOES = Counter(
+    'http_excecoes_total', 'Exceções não tratadas nas views',
+    ['grupo', 'rota']
+)
+
+ESPERA_POOL = Histogram(
+    'db_pool_espera_segundos', 'Tempo até o pool de conexões entregar uma conexão',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30)
+)
+EVENTOS_POOL = Counter(
+    'db_pool_eventos_total', 'Eventos do pool de conexões (timeouts, conexões abertas, invalidadas)',
+    ['evento']
+)
+# Estado do pool de cada worker vivo, somado entre os workers
+CONEXOES_POOL = Gauge(
+    'db_pool_conexoes', 'Conexões do pool por estado',
+    ['estado'], multiprocess_mode='livesum'
+)
+
+ENTREGAS_CRIADAS = Counter('entregas_criadas_total', 'Entregas cadastradas', ['origem'])
+TRANSICOES_STATUS = Counter('entregas_transicoes_status_total', 'Atualizações de status gravadas no histórico', ['status'])
+LOGINS = Counter('logins_total', 'Tentativas de login', ['resultado'])
+
+
+def _grupo():
+    # Blueprint da rota; as rotas de relatório ficam direto no app (main.py)
+    if request.blueprint:
+        return request.blueprint
+    if request.url_rule is not None and request.url_rule.rule.startswith('/api/relatorio'):
+        return 'relatorio'
+    return 'app'
+
+
+def _rota():
+    # Padrão da rota (ex.: /api/entregas/<codigo_rastreio>), para não criar uma série por código
+    return request.url_rule.rule if request.url_rule is not None else 'nao_encontrada'
+
+
+def init_app(app):
+    @app.before_request
+    def iniciar_medicao():
+        g.inicio_metricas = time.perf_counter()
+
+    @app.after_request
+    def medir_requisicao(response):
+        if request.url_rule is not None and request.url_rule.endpoint == 'metricas.get_metricas':
+            return response
+        duracao = time.perf_counter() - g.get('inicio_metricas', time.perf_counter())
+        registrar_requisicao(_grupo(), request.method, _rota(), response.status_code, duracao)
+        return response
+
+    def excecao_na_view(sender, exception, **extra):
+        registrar_excecao(_grupo(), _rota())
+
+    got_request_exception.connect(excecao_na_view, app, weak=False)
+
+
+def registrar_requisicao(grupo, metodo, rota, status, duracao):
+    # Também usado pelos handlers nativos do modo ASGI (asgi.py), com os mesmos grupos e rotas
+    DURACAO_REQUISICAO.labels(grupo, metodo, rota).observe(duracao)
+    REQUISICOES.labels(grupo, metodo, rota, str(status)).inc()
+
+
+def registrar_excecao(grupo, rota):
+    EXCECOES.labels(grupo, rota).inc()
+
+
+def atualizar_pool(pool):
+    if hasattr(pool, 'checkedout'):
+        CONEXOES_POOL.labels('em_uso').set(pool.checkedout())
+        CONEXOES_POOL.labels('livres').set(pool.checkedin())
+        CONEXOES_POOL.labels('overflow').set(max(pool.overflow(), 0))
+
+
+def registrar_espera_pool(espera_ms):
+    ESPERA_POOL.observe(espera_ms / 1000)
+
+
+def registrar_evento_pool(evento):
+    EVENTOS_POOL.labels(evento).inc()
+
+
+def registrar_entregas_criadas(quantidade, origem='api'):
+    ENTREGAS_CRIADAS.labels(origem).inc(quantidade)
+
+
+def registrar_transicoes(status):
+    for s in status:
+        TRANSICOES_STATUS.labels(s).inc()
+
+
+def registrar_login(sucesso):
+    LOGINS.labels('sucesso' if sucesso else 'falha').inc()
+
+
+def gerar():
+    # Texto de exposição do Prometheus (todos os workers no modo multiprocesso)
+    if MULTIPROCESSO:
+        registro = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registro)
+    else:
+        registro = REGISTRY
+    return generate_latest(registro), CONTENT_TYPE_LATEST
@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+from sqlalchemy import func, select # type: ignore
+from models.models import db
+from services import indices
+
+# Limites de página para listagens paginadas
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+
+def codificar_cursor(data_criacao, id):
+    # Cursor opaco com a chave (data_criacao, id) do último item da página
+    bruto = f'{data_criacao.isoformat()}|{id}'
+    return base64.urlsafe_b64encode(bruto.encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    # Devolve (data_criacao, id); lança ValueError se o cursor for inválido
+    try:
+        bruto = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        data_criacao, id = bruto.split('|')
+        return datetime.fromisoformat(data_criacao), int(id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+
+def estimar_total(consulta, sessao=None):
+    # Estimativa do total de linhas de um select() sem COUNT(*): no Postgres usa a estimativa
+    # do planejador (EXPLAIN); nos demais bancos (SQLite nos testes) conta de fato
+    sessao = sessao or db.session
+    consulta = consulta.order_by(None)
+    if sessao.get_bind().dialect.name != 'postgresql':
+        return sessao.scalar(select(func.count()).select_from(consulta.subquery()))
+
+    plano = indices.explicar(consulta, sessao)
+    return int(plano[0]['Plan']['Plan Rows'])
@@ -0,0 +1,153 @@
+import os
+import threading
+import time
+from flask import g, has_request_context, request # type: ignore
+from sqlalchemy import event # type: ignore
+
+# Perfil de banco por requisição: nº de comandos SQL, tempo total no banco e comandos lentos.
+#   PERFIL_MAX_CONSULTAS / PERFIL_MAX_DB_MS: requisições acima disso são registradas no log
+#   PERFIL_CONSULTA_LENTA_MS: comandos mais lentos que isso vão para o log com os parâmetros
+#   PERFIL_HISTOGRAMA=1: histograma por endpoint em GET /api/diagnostico/consultas
+#   PERFIL_MODO_TESTE=1 (ou app.testing): estourar o limite de consultas do endpoint é erro
+#   DB_LOG_REQUISICOES=1: uma linha de log por requisição com tempo de banco e espera no pool
+MAX_CONSULTAS = int(os.environ.get('PERFIL_MAX_CONSULTAS', '30'))
+MAX_DB_MS = float(os.environ.get('PERFIL_MAX_DB_MS', '500'))
+CONSULTA_LENTA_MS = float(os.environ.get('PERFIL_CONSULTA_LENTA_MS', '200'))
+HISTOGRAMA = os.environ.get('PERFIL_HISTOGRAMA', '0') == '1'
+MODO_TESTE = os.environ.get('PERFIL_MODO_TESTE', '0') == '1'
+LOG_REQUISICOES = os.environ.get('DB_LOG_REQUISICOES', '0') == '1'
+
+# Limites superiores das faixas do histograma
+FAIXAS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+FAIXAS_DB_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+# Tamanho máximo do SQL e dos parâmetros no log de comandos lentos
+TAMANHO_LOG = 500
+
+
+class Histograma:
+    # Distribuição de consultas e tempo de banco por endpoint (neste worker)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    @staticmethod
+    def _faixa(faixas, valor):
+        for limite in faixas:
+            if valor <= limite:
+                return str(limite)
+        return '+Inf'
+
+    def registrar(self, endpoint, consultas, tempo_db_ms):
+        with self._lock:
+            dados = self._endpoints.setdefault(endpoint, {
+                'requisicoes': 0, 'consultas_total': 0, 'consultas_maximo': 0, 'db_ms_total': 0.0,
+                'consultas': {}, 'db_ms': {}
+            })
+            dados['requisicoes'] += 1
+            dados['consultas_total'] += consultas
+            dados['consultas_maximo'] = max(dados['consultas_maximo'], consultas)
+            dados['db_ms_total'] += tempo_db_ms
+            faixa = self._faixa(FAIXAS_CONSULTAS, consultas)
+            dados['consultas'][faixa] = dados['consultas'].get(faixa, 0) + 1
+            faixa = self._faixa(FAIXAS_DB_MS, tempo_db_ms)
+            dados['db_ms'][faixa] = dados['db_ms'].get(faixa, 0) + 1
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                endpoint: dict(dados, db_ms_total=round(dados['db_ms_total'], 3),
+                               consultas=dict(dados['consultas']), db_ms=dict(dados['db_ms']))
+                for endpoint, dados in self._endpoints.items()
+            }
+
+
+histograma = Histograma()
+
+
+def _resumir(valor):
+    texto = repr(valor)
+    return texto if len(texto) <= TAMANHO_LOG else texto[:TAMANHO_LOG] + '...'
+
+
+def instrumentar(engine, logger):
+    # Conta comandos e tempo de banco da requisição atual (g) e registra comandos lentos
+    @event.listens_for(engine, 'before_cursor_execute')
+    def antes(conexao, cursor, sql, parametros, contexto, executemany):
+        conexao.info.setdefault('inicio_comando', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def depois(conexao, cursor, sql, parametros, contexto, executemany):
+        duracao_ms = (time.perf_counter() - conexao.info['inicio_comando'].pop()) * 1000
+        if has_request_context():
+            g.consultas_db = g.get('consultas_db', 0) + 1
+            g.tempo_db_ms = g.get('tempo_db_ms', 0.0) + duracao_ms
+        if duracao_ms >= CONSULTA_LENTA_MS:
+            origem = f'{request.method} {request.path}' if has_request_context() else '-'
+            logger.warning(f'Consulta lenta ({duracao_ms:.1f}ms) em {origem}: {_resumir(sql)} parâmetros={_resumir(parametros)}')
+
+    @event.listens_for(engine, 'handle_error')
+    def erro(contexto):
+        # Comando com erro não passa por after_cursor_execute
+        if contexto.connection is not None and contexto.connection.info.get('inicio_comando'):
+            contexto.connection.info['inicio_comando'].pop()
+
+
+def definir_blocos(registros, bloco):
+    # Endpoints em lote: o limite (fixo, por_bloco) vale para ceil(registros / bloco) blocos
+    g.blocos_consultas = max(1, -(-registros // bloco))
+
+
+def limite_consultas(limite):
+    # Limite do endpoint: um número, ou (fixo, por_bloco) nos endpoints em lote
+    if isinstance(limite, tuple):
+        fixo, por_bloco = limite
+        return fixo + por_bloco * g.get('blocos_consultas', 1)
+    return limite
+
+
+def init_app(app, db):
+    with app.app_context():
+        engine = db.engine
+    instrumentar(engine, app.logger)
+    if LOG_REQUISICOES:
+        app.logger.setLevel('INFO')
+
+    @app.before_request
+    def iniciar_perfil():
+        g.inicio_requisicao = time.perf_counter()
+
+    @app.after_request
+    def registrar_perfil(response):
+        consultas = g.get('consultas_db', 0)
+        tempo_db_ms = g.get('tempo_db_ms', 0.0)
+        espera_pool_ms = g.get('espera_pool_ms', 0.0)
+        total_ms = (time.perf_counter() - g.get('inicio_requisicao', time.perf_counter())) * 1000
+        endpoint = request.endpoint or 'desconhecido'
+
+        response.headers['Server-Timing'] = (
+            f'db;dur={tempo_db_ms:.1f};desc="{consultas} consultas", '
+            f'pool;dur={espera_pool_ms:.1f}, app;dur={total_ms:.1f}'
+        )
+        if HISTOGRAMA:
+            histograma.registrar(endpoint, consultas, tempo_db_ms)
+        if LOG_REQUISICOES:
+            app.logger.info(
+                f'{request.method} {request.path} {response.status_code} consultas={consultas} '
+                f'db={tempo_db_ms:.1f}ms espera_pool={espera_pool_ms:.1f}ms total={total_ms:.1f}ms '
+                f"pool_em_uso={engine.pool.checkedout() if hasattr(engine.pool, 'checkedout') else '-'}"
+            )
+        if consultas > MAX_CONSULTAS or tempo_db_ms > MAX_DB_MS:
+            app.logger.warning(
+                f'Requisição pesada no banco: {request.method} {request.path} ({endpoint}) '
+                f'consultas={consultas} db={tempo_db_ms:.1f}ms'
+            )
+
+        # Orçamento de consultas por endpoint (PERFIL_LIMITES_CONSULTAS): nos testes, estourar é falha
+        limite = app.config.get('PERFIL_LIMITES_CONSULTAS', {}).get(endpoint)
+        if limite is not None:
+            limite = limite_consultas(limite)
+        if limite is not None and consultas > limite and (MODO_TESTE or app.testing):
+            raise AssertionError(f'{endpoint} executou {consultas} consultas (limite: {limite})')
+        return response
@@ -0,0 +1,416 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, case, cast, and_, or_, literal, literal_column, Date # type: ignore
+from models.models import db, Entrega, AtualizacaoStatus, Usuario, KpiDiario
+
+# Status considerados finais (a entrega saiu do fluxo operacional)
+STATUS_FINAIS = ['Entregue', 'Devolvido']
+
+
+def resolver_periodo(periodo, data_inicio=None, data_fim=None):
+    # Converte os parâmetros de filtro em (data_inicio, data_fim)
+    # Lança ValueError se as datas informadas não estiverem em ISO 8601
+    hoje = datetime.now()
+    if not data_inicio or not data_fim:
+        if periodo == 'mes':
+            data_inicio = datetime(hoje.year, hoje.month, 1)
+            # Último dia do mês atual
+            if hoje.month == 12:
+                data_fim = datetime(hoje.year + 1, 1, 1) - timedelta(days=1)
+            else:
+                data_fim = datetime(hoje.year, hoje.month + 1, 1) - timedelta(days=1)
+        elif periodo == 'trimestre':
+            # Primeiro dia do trimestre atual
+            trimestre_atual = ((hoje.month - 1) // 3) + 1
+            data_inicio = datetime(hoje.year, (trimestre_atual - 1) * 3 + 1, 1)
+            if trimestre_atual == 4:
+                data_fim = datetime(hoje.year + 1, 1, 1) - timedelta(days=1)
+            else:
+                data_fim = datetime(hoje.year, trimestre_atual * 3 + 1, 1) - timedelta(days=1)
+        elif periodo == 'ano':
+            data_inicio = datetime(hoje.year, 1, 1)
+            data_fim = datetime(hoje.year, 12, 31)
+        else:
+            # Período personalizado - usar últimos 30 dias como padrão
+            data_inicio = hoje - timedelta(days=30)
+            data_fim = hoje
+        return data_inicio, data_fim
+
+    # Converter strings para objetos datetime
+    data_inicio = datetime.fromisoformat(data_inicio.replace('Z', '+00:00'))
+    data_fim = datetime.fromisoformat(data_fim.replace('Z', '+00:00'))
+    return data_inicio, data_fim
+
+
+def _formatar_data(valor):
+    # func.date() devolve date no Postgres e string no SQLite
+    if valor is None:
+        return None
+    return valor.isoformat() if hasattr(valor, 'isoformat') else str(valor)
+
+
+def contar(condicao):
+    # COUNT condicional: SUM(CASE WHEN <condicao> THEN 1 ELSE 0 END)
+    return func.coalesce(func.sum(case((condicao, 1), else_=0)), 0)
+
+
+def filtro_periodo(data_inicio, data_fim):
+    return and_(Entrega.data_criacao >= data_inicio, Entrega.data_criacao <= data_fim)
+
+
+# Condições reutilizadas pelos agregados
+ENTREGUE = Entrega.status == 'Entregue'
+NO_PRAZO = and_(ENTREGUE, or_(Entrega.data_prevista_entrega.is_(None),
+                                Entrega.data_atualizacao <= Entrega.data_prevista_entrega))
+ATRASADA = and_(ENTREGUE, Entrega.data_prevista_entrega.isnot(None),
+                 Entrega.data_atualizacao > Entrega.data_prevista_entrega)
+
+
+def _taxa(parte, total):
+    return (parte / total * 100) if total > 0 else 0
+
+
+def dialeto():
+    return db.session.get_bind().dialect.name
+
+
+def _duracao_dias(inicio, fim):
+    # Diferença entre dois timestamps em dias, calculada no banco
+    if dialeto() == 'postgresql':
+        return func.extract('epoch', fim - inicio) / 86400.0
+    return func.julianday(fim) - func.julianday(inicio)
+
+
+def _percentil(valores, p):
+    # Percentil com interpolação linear (mesma semântica de percentile_cont)
+    if not valores:
+        return 0
+    posicao = (len(valores) - 1) * p
+    inferior = int(posicao)
+    superior = min(inferior + 1, len(valores) - 1)
+    return valores[inferior] + (valores[superior] - valores[inferior]) * (posicao - inferior)
+
+
+PERCENTIS_TEMPO_ENTREGA = (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))
+
+
+def tempos_entrega(data_inicio, data_fim):
+    # Tempo (em dias) entre o registro e a última atualização 'Entregue',
+    # calculado em uma única consulta: MAX(timestamp) por entrega + JOIN.
+    # Sempre sobre entregas: os percentis precisam da duração de cada entrega, que a consolidação não guarda.
+    por_entrega = db.session.query(
+        _duracao_dias(Entrega.data_criacao, func.max(AtualizacaoStatus.timestamp)).label('dias')
+    ).join(
+        AtualizacaoStatus, and_(AtualizacaoStatus.entrega_id == Entrega.id,
+                                AtualizacaoStatus.status == 'Entregue')
+    ).filter(
+        filtro_periodo(data_inicio, data_fim), ENTREGUE
+    ).group_by(Entrega.id, Entrega.data_criacao).subquery()
+
+    duracao = por_entrega.c.dias
+    consulta = db.session.query().select_from(por_entrega)
+
+    if dialeto() == 'postgresql':
+        # Média e percentis calculados inteiramente no Postgres
+        colunas = [func.avg(duracao)] + [
+            func.percentile_cont(p).within_group(duracao) for _, p in PERCENTIS_TEMPO_ENTREGA
+        ]
+        linha = consulta.with_entities(*colunas).one()
+        valores = [float(v) if v is not None else 0 for v in linha]
+        return valores[0], dict(zip((nome for nome, _ in PERCENTIS_TEMPO_ENTREGA), valores[1:]))
+
+    # Demais bancos (SQLite nos testes): só a coluna de durações, já ordenada
+    duracoes = [float(v) for (v,) in consulta.with_entities(duracao).order_by(duracao)]
+    media = sum(duracoes) / len(duracoes) if duracoes else 0
+    return media, {nome: _percentil(duracoes, p) for nome, p in PERCENTIS_TEMPO_ENTREGA}
+
+
+def _linhas_entregas(*condicoes):
+    # Uma linha por entrega, já no formato da consolidação diária
+    return db.session.query(
+        func.date(Entrega.data_criacao).label('dia'),
+        Entrega.status.label('status'),
+        Entrega.motorista_id.label('motorista_id'),
+        Entrega.regiao.label('regiao'),
+        literal(1).label('total'),
+        case((NO_PRAZO, 1), else_=0).label('no_prazo'),
+        case((ATRASADA, 1), else_=0).label('atrasadas'),
+        Entrega.km.label('km'),
+        Entrega.peso.label('peso'),
+        Entrega.preco.label('preco')
+    ).filter(*condicoes)
+
+
+def _dias_completos(data_inicio, data_fim):
+    # Primeiro dia inteiro e o dia (exclusivo) em que começa a borda final do período
+    primeiro = data_inicio.date()
+    if data_inicio != datetime(primeiro.year, primeiro.month, primeiro.day, tzinfo=data_inicio.tzinfo):
+        primeiro += timedelta(days=1)
+    return primeiro, data_fim.date()
+
+
+def fonte_kpis(data_inicio, data_fim, usar_consolidacao=False):
+    # Subconsulta (dia, status, motorista_id, regiao, total, no_prazo, atrasadas, km, peso, preco)
+    # sobre a qual os agregados do relatório são calculados.
+    # Com a consolidação ativa, os dias inteiros do período vêm de kpis_diarios e
+    # só as bordas parciais (no máximo dois dias) são lidas de entregas.
+    if not usar_consolidacao:
+        return _linhas_entregas(filtro_periodo(data_inicio, data_fim)).subquery('fonte')
+
+    primeiro, ultimo = _dias_completos(data_inicio, data_fim)
+    if primeiro >= ultimo:
+        return _linhas_entregas(filtro_periodo(data_inicio, data_fim)).subquery('fonte')
+
+    inicio_completo = datetime(primeiro.year, primeiro.month, primeiro.day, tzinfo=data_inicio.tzinfo)
+    fim_completo = datetime(ultimo.year, ultimo.month, ultimo.day, tzinfo=data_fim.tzinfo)
+    consolidados = db.session.query(*(
+        getattr(KpiDiario, coluna).label(coluna) for coluna in
+        ('dia', 'status', 'motorista_id', 'regiao', 'total', 'no_prazo', 'atrasadas', 'km', 'peso', 'preco')
+    )).filter(KpiDiario.dia >= primeiro, KpiDiario.dia < ultimo, KpiDiario.total > 0)
+    bordas = _linhas_entregas(or_(
+        and_(Entrega.data_criacao >= data_inicio, Entrega.data_criacao < inicio_completo),
+        and_(Entrega.data_criacao >= fim_completo, Entrega.data_criacao <= data_fim)
+    ))
+    return consolidados.union_all(bordas).subquery('fonte')
+
+
+def _colunas_ordenacao(fonte):
+    # Colunas aceitas para ordenar o ranking de motoristas
+    total = func.coalesce(func.sum(fonte.c.total), 0)
+    no_prazo = func.coalesce(func.sum(fonte.c.no_prazo), 0)
+    return {
+        'volume': total,
+        'taxa_entrega': no_prazo * 1.0 / total,
+        'receita': func.coalesce(func.sum(fonte.c.preco), 0),
+        'km': func.coalesce(func.sum(fonte.c.km), 0)
+    }
+
+
+ORDENACOES_MOTORISTAS = ('volume', 'taxa_entrega', 'receita', 'km')
+
+
+def desempenho_motoristas(fonte, ordenar_por='volume', limite=None):
+    # Ranking de motoristas em uma única consulta agrupada com JOIN em usuarios
+    colunas = _colunas_ordenacao(fonte)
+    consulta = db.session.query(
+        Usuario.id,
+        Usuario.username,
+        colunas['volume'],
+        func.coalesce(func.sum(fonte.c.no_prazo), 0),
+        colunas['receita'],
+        colunas['km']
+    ).join(
+        fonte, fonte.c.motorista_id == Usuario.id
+    ).group_by(Usuario.id, Usuario.username).order_by(
+        colunas[ordenar_por].desc(), Usuario.id
+    )
+    if limite and limite > 0:
+        consulta = consulta.limit(limite)
+
+    resultado = []
+    for m_id, nome, total_motorista, no_prazo_motorista, receita, km in consulta:
+        total_motorista, no_prazo_motorista = int(total_motorista), int(no_prazo_motorista)
+        resultado.append({
+            'id': m_id,
+            'nome': nome,
+            'total_entregas': total_motorista,
+            'entregas_no_prazo': no_prazo_motorista,
+            'taxa_entrega': _taxa(no_prazo_motorista, total_motorista),
+            'receita_total': float(receita),
+            'km_total': float(km)
+        })
+    return resultado
+
+
+def relatorio_desempenho(data_inicio, data_fim, ordenar_motoristas='volume', limite_motoristas=None,
+                         usar_consolidacao=False):
+    # Monta o relatório de desempenho inteiro com agregados SQL,
+    # sem carregar as linhas de entregas para o Python
+    fonte = fonte_kpis(data_inicio, data_fim, usar_consolidacao)
+    tempo_medio_entrega, percentis_tempo_entrega = tempos_entrega(data_inicio, data_fim)
+
+    # Distribuição de status; os KPIs gerais e avançados saem da mesma consulta
+    por_status = db.session.query(
+        fonte.c.status,
+        func.sum(fonte.c.total),
+        func.sum(fonte.c.no_prazo),
+        func.sum(fonte.c.atrasadas),
+        func.sum(fonte.c.km),
+        func.sum(fonte.c.peso),
+        func.sum(fonte.c.preco)
+    ).group_by(fonte.c.status).all()
+
+    total_entregas = entregas_no_prazo = entregas_atrasadas = entregas_devolvidas = entregas_pendentes = 0
+    km_total = peso_total = receita_total = 0.0
+    distribuicao_status = []
+    for status, total, no_prazo, atrasadas, km, peso, preco in por_status:
+        total = int(total)
+        total_entregas += total
+        entregas_no_prazo += int(no_prazo)
+        entregas_atrasadas += int(atrasadas)
+        if status == 'Devolvido':
+            entregas_devolvidas += total
+        if status not in STATUS_FINAIS:
+            entregas_pendentes += total
+        km_total += float(km or 0)
+        peso_total += float(peso or 0)
+        receita_total += float(preco or 0)
+        distribuicao_status.append({'status': status, 'total': total})
+
+    # Entregas por dia (para o gráfico)
+    por_dia = db.session.query(fonte.c.dia, func.sum(fonte.c.total)).group_by(fonte.c.dia).order_by(fonte.c.dia).all()
+    entregas_por_dia = [{'data': _formatar_data(d), 'total': int(total)} for d, total in por_dia]
+
+    return {
+        'periodo': {
+            'inicio': data_inicio.isoformat(),
+            'fim': data_fim.isoformat()
+        },
+        'kpis_gerais': {
+            'total_entregas': total_entregas,
+            'entregas_no_prazo': entregas_no_prazo,
+            'entregas_atrasadas': entregas_atrasadas,
+            'entregas_devolvidas': entregas_devolvidas,
+            'entregas_pendentes': entregas_pendentes,
+            'taxa_entrega': _taxa(entregas_no_prazo, total_entregas),
+            'taxa_atraso': _taxa(entregas_atrasadas, total_entregas),
+            'taxa_devolucao': _taxa(entregas_devolvidas, total_entregas),
+            'tempo_medio_entrega': tempo_medio_entrega,
+            'percentis_tempo_entrega': percentis_tempo_entrega
+        },
+        'kpis_avancados': {
+            'km_total': km_total,
+            'peso_total': peso_total,
+            'receita_total': receita_total,
+            'custo_por_km': receita_total / km_total if km_total > 0 else 0,
+            'receita_por_entrega': receita_total / total_entregas if total_entregas > 0 else 0
+        },
+        'desempenho_motoristas': desempenho_motoristas(fonte, ordenar_motoristas, limite_motoristas),
+        # Campos adicionais esperados pelo frontend
+        'entregas_por_dia': entregas_por_dia,
+        'distribuicao_status': distribuicao_status
+    }
+
+
+# Motivos de atraso/devolução: quantos aparecem no relatório (o restante vai para "Outros")
+LIMITE_MOTIVOS = 10
+MOTIVO_OUTROS = 'Outros'
+STATUS_PROBLEMA = ['Atrasado', 'Problema na entrega', 'Devolvido']
+# Tendência dos motivos: granularidade -> unidade do date_trunc (Postgres)
+GRANULARIDADES = {'semana': 'week', 'mes': 'month'}
+
+
+def _chave_motivo(coluna):
+    # Motivos digitados livremente: " Chuva", "chuva " e "CHUVA" são o mesmo motivo
+    return func.lower(func.trim(coluna))
+
+
+def _inicio_periodo(granularidade):
+    # Primeiro dia da semana (segunda-feira) ou do mês de data_criacao, como date
+    if dialeto() == 'postgresql':
+        unidade = literal_column(f"'{GRANULARIDADES[granularidade]}'")
+        return cast(func.date_trunc(unidade, Entrega.data_criacao), Date)
+    if granularidade == 'semana':
+        return func.date(Entrega.data_criacao, literal_column("'weekday 0'"), literal_column("'-6 days'"))
+    return func.strftime(literal_column("'%Y-%m-01'"), Entrega.data_criacao)
+
+
+def _motivos(coluna, data_inicio, data_fim, total, limite):
+    # Top-N motivos normalizados no período, com o restante somado em "Outros".
+    # Devolve (lista, {chave: motivo}); o texto exibido é a menor grafia (sem espaços) do grupo.
+    chave = _chave_motivo(coluna)
+    quantidade = func.count(Entrega.id)
+    linhas = db.session.query(chave, func.min(func.trim(coluna)), quantidade).filter(
+        filtro_periodo(data_inicio, data_fim),
+        func.trim(coluna) != ''
+    ).group_by(chave).order_by(quantidade.desc(), chave).limit(limite).all()
+
+    motivos = [{'motivo': motivo, 'quantidade': n} for _, motivo, n in linhas]
+    outros = total - sum(n for _, _, n in linhas)
+    if outros > 0:
+        motivos.append({'motivo': MOTIVO_OUTROS, 'quantidade': outros})
+    return motivos, {c: motivo for c, motivo, _ in linhas}
+
+
+def _tendencia_motivos(coluna, data_inicio, data_fim, principais, granularidade):
+    # Quantidade por período dos motivos principais e de "Outros": no máximo (N + 1) linhas por período
+    chave = _chave_motivo(coluna)
+    periodo = _inicio_periodo(granularidade)
+    quantidade = func.count(Entrega.id)
+    filtros = (filtro_periodo(data_inicio, data_fim), func.trim(coluna) != '')
+
+    tendencia = [
+        {'periodo': _formatar_data(p), 'motivo': principais[c], 'quantidade': n}
+        for p, c, n in db.session.query(periodo, chave, quantidade).filter(
+            *filtros, chave.in_(list(principais))
+        ).group_by(periodo, chave).all()
+    ] if principais else []
+    tendencia += [
+        {'periodo': _formatar_data(p), 'motivo': MOTIVO_OUTROS, 'quantidade': n}
+        for p, n in db.session.query(periodo, quantidade).filter(
+            *filtros, chave.notin_(list(principais))
+        ).group_by(periodo).all()
+    ]
+    return sorted(tendencia, key=lambda linha: (linha['periodo'], -linha['quantidade'], linha['motivo']))
+
+
+def relatorio_qualidade(data_inicio, data_fim, limite_motivos=LIMITE_MOTIVOS, granularidade=None,
+                        usar_consolidacao=False):
+    # Motivos de atraso/devolução e problemas por região no período, agregados no banco.
+    # Com granularidade ('semana' ou 'mes'), inclui a tendência dos motivos por período.
+    # Contagens por status e por região vêm de fonte_kpis (consolidação diária, se ativa);
+    # os motivos são texto livre, que a consolidação não guarda, e são lidos de entregas.
+    fonte = fonte_kpis(data_inicio, data_fim, usar_consolidacao)
+    por_status = dict(db.session.query(fonte.c.status, func.sum(fonte.c.total)).filter(
+        fonte.c.status.in_(STATUS_PROBLEMA)
+    ).group_by(fonte.c.status).all())
+    total_problemas, total_atrasos, total_devolucoes = (
+        int(por_status.get(status) or 0) for status in ('Problema na entrega', 'Atrasado', 'Devolvido')
+    )
+
+    totais_motivos = db.session.query(
+        contar(func.trim(Entrega.motivo_atraso) != ''),
+        contar(func.trim(Entrega.motivo_devolucao) != '')
+    ).filter(filtro_periodo(data_inicio, data_fim)).one()
+    total_motivos_atraso, total_motivos_devolucao = (int(v) for v in totais_motivos)
+
+    motivos_atraso, principais_atraso = _motivos(Entrega.motivo_atraso, data_inicio, data_fim,
+                                                 total_motivos_atraso, limite_motivos)
+    motivos_devolucao, principais_devolucao = _motivos(Entrega.motivo_devolucao, data_inicio, data_fim,
+                                                       total_motivos_devolucao, limite_motivos)
+
+    # Contar problemas por região (coluna regiao, derivada do destino na gravação)
+    quantidade = func.sum(fonte.c.total)
+    problemas_por_regiao = {regiao: int(n) for regiao, n in db.session.query(fonte.c.regiao, quantidade).filter(
+        fonte.c.status.in_(STATUS_PROBLEMA)
+    ).group_by(fonte.c.regiao).order_by(quantidade.desc()).all()}
+
+    # Combinar motivos de atraso e devolução para o gráfico de motivos de problemas
+    motivos_problemas = [{'motivo': f"Atraso: {m['motivo']}", 'total': m['quantidade']} for m in motivos_atraso]
+    motivos_problemas += [{'motivo': f"Devolução: {m['motivo']}", 'total': m['quantidade']} for m in motivos_devolucao]
+
+    # Preparar resposta com os campos adicionais esperados pelo frontend
+    response = {
+        'periodo': {
+            'inicio': data_inicio.isoformat(),
+            'fim': data_fim.isoformat()
+        },
+        'motivos_atraso': motivos_atraso,
+        'motivos_devolucao': motivos_devolucao,
+        'problemas_por_regiao': [{'regiao': k, 'quantidade': v} for k, v in problemas_por_regiao.items()],
+        # Campos adicionais esperados pelo frontend
+        'total_problemas': total_problemas,
+        'total_atrasos': total_atrasos,
+        'total_devolucoes': total_devolucoes,
+        'motivos_problemas': motivos_problemas
+    }
+
+    if granularidade:
+        response['tendencia_motivos'] = {
+            'granularidade': granularidade,
+            'motivos_atraso': _tendencia_motivos(Entrega.motivo_atraso, data_inicio, data_fim,
+                                                 principais_atraso, granularidade),
+            'motivos_devolucao': _tendencia_motivos(Entrega.motivo_devolucao, data_inicio, data_fim,
+                                                    principais_devolucao, granularidade)
+        }
+
+    return response
@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import check_password_hash, generate_password_hash # type: ignore
+
+# Hash de senhas fora das threads de requisição, em um pool limitado: numa rajada de logins
+# (troca de turno) no máximo SENHA_THREADS hashes rodam ao mesmo tempo e as demais requisições
+# continuam sendo atendidas. O pbkdf2/scrypt do hashlib liberam o GIL, então threads bastam.
+#   SENHA_METODO: método e custo do werkzeug, ex.: pbkdf2:sha256:600000 ou scrypt:32768:8:1.
+#   Hashes gravados com outro método/custo são refeitos no próximo login bem-sucedido.
+METODO = os.environ.get('SENHA_METODO', 'pbkdf2:sha256:600000')
+THREADS = int(os.environ.get('SENHA_THREADS', str(os.cpu_count() or 2)))
+
+_executor = None
+_lock = threading.Lock()
+# Média móvel do tempo de uma verificação, usada para o caminho de usuário inexistente
+_duracao_verificacao = None
+
+
+def _pool():
+    # Criado sob demanda em cada processo (os workers do gunicorn são criados por fork)
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=THREADS, thread_name_prefix='senhas')
+        return _executor
+
+
+def gerar_hash(senha):
+    return _pool().submit(generate_password_hash, senha, METODO).result()
+
+
+def verificar(password_hash, senha):
+    global _duracao_verificacao
+    inicio = time.perf_counter()
+    valida = _pool().submit(check_password_hash, password_hash, senha).result()
+    duracao = time.perf_counter() - inicio
+    if precisa_rehash(password_hash):
+        # Hash com custo antigo não representa o tempo de uma verificação atual
+        return valida
+    with _lock:
+        _duracao_verificacao = duracao if _duracao_verificacao is None else 0.9 * _duracao_verificacao + 0.1 * duracao
+    return valida
+
+
+def precisa_rehash(password_hash):
+    # Prefixo do hash do werkzeug: "<método>$<salt>$<hash>"
+    return password_hash.split('$', 1)[0] != METODO
+
+
+def simular_verificacao():
+    # Usuário inexistente: espera o tempo de uma verificação real (a resposta não revela se o
+    # usuário existe) sem calcular hash, então tentativas com nomes inválidos não gastam CPU
+    if _duracao_verificacao is None:
+        # Primeira vez no processo: mede com uma verificação de verdade
+        verificar(gerar_hash(''), 'x')
+        return
+    time.sleep(_duracao_verificacao)
@@ -0,0 +1,207 @@
+import json
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import case # type: ignore
+from models.models import db, TarefaRelatorio
+from services import relatorios, exportacao
+
+# Fila local: os relatórios pesados rodam em um pool limitado de threads do próprio processo.
+# O estado fica no banco e o resultado em um arquivo em RELATORIO_DIRETORIO, então qualquer worker
+# do gunicorn atende consultas e downloads (com várias máquinas, o diretório deve ser compartilhado).
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('RELATORIO_WORKERS', '2')),
+    thread_name_prefix='relatorio'
+)
+
+TIPOS = ('desempenho', 'qualidade', 'excel')
+
+DIRETORIO = os.path.abspath(os.environ.get('RELATORIO_DIRETORIO', os.path.join(tempfile.gettempdir(), 'relatorios_expresso')))
+
+# Resultados de períodos ainda abertos são reaproveitados só por este tempo
+VALIDADE_RESULTADO = timedelta(minutes=int(os.environ.get('RELATORIO_VALIDADE_MINUTOS', '10')))
+# Tarefas "executando" há mais tempo que isso são consideradas perdidas (worker reiniciado)
+TEMPO_MAXIMO_EXECUCAO = timedelta(minutes=30)
+# Quantas vezes um relatório é gerado de novo por alterações nas entregas durante a geração
+MAXIMO_GERACOES = int(os.environ.get('RELATORIO_MAXIMO_GERACOES', '3'))
+
+
+def _sem_fuso(data):
+    return data.replace(tzinfo=None) if data.tzinfo else data
+
+
+def chave(tipo, data_inicio, data_fim):
+    # Chave de cache: tipo do relatório + período normalizado
+    return f'{tipo}|{_sem_fuso(data_inicio).isoformat()}|{_sem_fuso(data_fim).isoformat()}'
+
+
+def periodo_fechado(data_fim):
+    # Período inteiramente no passado: o resultado não muda mais
+    hoje = datetime.now()
+    return _sem_fuso(data_fim) < datetime(hoje.year, hoje.month, hoje.day)
+
+
+def _reaproveitavel(tarefa):
+    agora = datetime.utcnow()
+    if tarefa.status == 'concluida':
+        return periodo_fechado(tarefa.data_fim) or tarefa.concluido_em >= agora - VALIDADE_RESULTADO
+    if tarefa.status == 'pendente':
+        return tarefa.criado_em >= agora - TEMPO_MAXIMO_EXECUCAO
+    if tarefa.status == 'executando':
+        return tarefa.iniciado_em is not None and tarefa.iniciado_em >= agora - TEMPO_MAXIMO_EXECUCAO
+    return False
+
+
+def marcar_desatualizadas(inicio, fim=None):
+    # Escrita em entregas com data_criacao em [inicio, fim] (sem fim, só a data inicio), na transação da escrita:
+    # - relatórios prontos cujo período cruza o intervalo passam a 'expirada' e não são mais reaproveitados nem baixados;
+    # - os que estão sendo gerados ficam marcados como desatualizados e são gerados de novo ao terminar.
+    # Os pendentes leem as entregas só ao começar, já com a escrita confirmada.
+    if inicio is None:
+        return
+    inicio = _sem_fuso(inicio)
+    fim = _sem_fuso(fim) if fim is not None else inicio
+    TarefaRelatorio.query.filter(
+        TarefaRelatorio.status.in_(('concluida', 'executando')),
+        TarefaRelatorio.data_inicio <= fim,
+        TarefaRelatorio.data_fim >= inicio
+    ).update({
+        'status': case((TarefaRelatorio.status == 'concluida', 'expirada'), else_=TarefaRelatorio.status),
+        'desatualizada': case((TarefaRelatorio.status == 'executando', True), else_=TarefaRelatorio.desatualizada)
+    }, synchronize_session=False)
+
+
+def enfileirar(app, tipo, data_inicio, data_fim):
+    # Cria (ou reaproveita) a tarefa do relatório e agenda a execução.
+    # Devolve (tarefa, nova).
+    chave_tarefa = chave(tipo, data_inicio, data_fim)
+
+    # Mesmo relatório já pronto ou em andamento: não gera de novo
+    existente = TarefaRelatorio.query.filter(
+        TarefaRelatorio.chave == chave_tarefa,
+        TarefaRelatorio.status != 'erro'
+    ).order_by(TarefaRelatorio.criado_em.desc()).first()
+    if existente and _reaproveitavel(existente):
+        return existente, False
+
+    # Resultados anteriores do mesmo relatório (expirados ou vencidos) serão substituídos
+    _remover_arquivos(TarefaRelatorio.query.filter(
+        TarefaRelatorio.chave == chave_tarefa,
+        TarefaRelatorio.arquivo.isnot(None)
+    ).all())
+
+    tarefa = TarefaRelatorio(
+        id=str(uuid.uuid4()),
+        tipo=tipo,
+        chave=chave_tarefa,
+        data_inicio=_sem_fuso(data_inicio),
+        data_fim=_sem_fuso(data_fim),
+        status='pendente',
+        criado_em=datetime.utcnow()
+    )
+    db.session.add(tarefa)
+    db.session.commit()
+
+    _executor.submit(_executar, app, tarefa.id)
+    return tarefa, True
+
+
+def _remover_arquivos(tarefas):
+    for tarefa in tarefas:
+        try:
+            os.remove(tarefa.arquivo)
+        except FileNotFoundError:
+            pass
+        tarefa.arquivo = None
+
+
+def _gerar(tarefa_id, tipo, data_inicio, data_fim, usar_consolidacao):
+    # Grava o resultado em DIRETORIO, sem carregá-lo em memória.
+    # Devolve (caminho do arquivo, mimetype, nome do arquivo para download)
+    nome = f"relatorio_{tipo}_{data_inicio.strftime('%Y-%m-%d')}_{data_fim.strftime('%Y-%m-%d')}"
+    os.makedirs(DIRETORIO, exist_ok=True)
+    extensao = 'xlsx' if tipo == 'excel' else 'json'
+    caminho = os.path.join(DIRETORIO, f'{tarefa_id}.{extensao}')
+    # Gravado com outro nome e renomeado ao final: um download nunca vê o arquivo pela metade
+    parcial = f'{caminho}.parcial'
+    try:
+        with open(parcial, 'wb') as arquivo:
+            if tipo == 'excel':
+                exportacao.gerar_xlsx(data_inicio, data_fim, usar_consolidacao, arquivo)
+            else:
+                if tipo == 'qualidade':
+                    dados = relatorios.relatorio_qualidade(data_inicio, data_fim, usar_consolidacao=usar_consolidacao)
+                else:
+                    dados = relatorios.relatorio_desempenho(data_inicio, data_fim, usar_consolidacao=usar_consolidacao)
+                arquivo.write(json.dumps(dados).encode('utf-8'))
+        os.replace(parcial, caminho)
+    except Exception:
+        if os.path.exists(parcial):
+            os.remove(parcial)
+        raise
+    if tipo == 'excel':
+        return caminho, 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', f'{nome}.{extensao}'
+    return caminho, 'application/json', f'{nome}.{extensao}'
+
+
+def _executar(app, tarefa_id):
+    with app.app_context():
+        tarefa = db.session.get(TarefaRelatorio, tarefa_id)
+        if tarefa is None:
+            return
+        # UPDATE direto: zera a marca de desatualizada mesmo que uma escrita a tenha gravado depois da leitura
+        TarefaRelatorio.query.filter_by(id=tarefa_id).update({
+            'status': 'executando',
+            'iniciado_em': datetime.utcnow(),
+            'desatualizada': False,
+            'geracoes': TarefaRelatorio.geracoes + 1
+        }, synchronize_session=False)
+        db.session.commit()
+
+        try:
+            caminho, mimetype, nome_arquivo = _gerar(
+                tarefa.id, tarefa.tipo, tarefa.data_inicio, tarefa.data_fim, app.config.get('KPIS_DIARIOS', False)
+            )
+        except Exception as e:
+            db.session.rollback()
+            app.logger.error(f"Erro ao gerar relatório {tarefa_id}: {str(e)}")
+            tarefa = db.session.get(TarefaRelatorio, tarefa_id)
+            tarefa.status = 'erro'
+            tarefa.erro = str(e)
+            tarefa.concluido_em = datetime.utcnow()
+            db.session.commit()
+            return
+
+        # Conclui só se nenhuma escrita no período marcou a tarefa durante a geração
+        concluidas = TarefaRelatorio.query.filter(
+            TarefaRelatorio.id == tarefa_id,
+            TarefaRelatorio.desatualizada.is_(False)
+        ).update({
+            'status': 'concluida',
+            'arquivo': caminho,
+            'mimetype': mimetype,
+            'nome_arquivo': nome_arquivo,
+            'concluido_em': datetime.utcnow()
+        }, synchronize_session=False)
+        db.session.commit()
+        if concluidas:
+            return
+
+        # Resultado desatualizado: descartado; gera de novo (até MAXIMO_GERACOES vezes)
+        os.remove(caminho)
+        tarefa = db.session.get(TarefaRelatorio, tarefa_id, populate_existing=True)
+        if tarefa.geracoes < MAXIMO_GERACOES:
+            tarefa.status = 'pendente'
+            db.session.commit()
+            _executor.submit(_executar, app, tarefa_id)
+        else:
+            tarefa.status = 'expirada'
+            tarefa.erro = 'Entregas do período alteradas durante a geração. Gere novamente'
+            tarefa.concluido_em = datetime.utcnow()
+            db.session.commit()
+
+
+def buscar(tarefa_id):
+    return db.session.get(TarefaRelatorio, tarefa_id)
@@ -0,0 +1,37 @@
+from functools import wraps
+from flask import current_app, g, jsonify, make_response
+from models.models import db
+
+
+def transacional(view):
+    # Unidade de trabalho por requisição: a view só faz flush (para obter ids) e o commit
+    # acontece uma única vez aqui, se a resposta for de sucesso (< 400); caso contrário,
+    # a transação é desfeita. Ações registradas com apos_commit rodam depois do commit.
+    @wraps(view)
+    def envolvida(*args, **kwargs):
+        g.apos_commit = []
+        response = make_response(view(*args, **kwargs))
+        if response.status_code >= 400:
+            db.session.rollback()
+            return response
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': str(e)}), 500
+
+        # A escrita já foi confirmada: uma ação que falha (ex.: Redis fora do ar) vai para o log
+        # e não transforma a resposta em 500, o que levaria o cliente a repetir a escrita
+        for funcao, argumentos in g.apos_commit:
+            try:
+                funcao(*argumentos)
+            except Exception:
+                current_app.logger.exception(f'Erro após o commit em {getattr(funcao, "__qualname__", funcao)}')
+        return response
+    return envolvida
+
+
+def apos_commit(funcao, *argumentos):
+    # Adia uma ação (ex.: invalidar caches) até a transação da requisição ser confirmada
+    g.apos_commit.append((funcao, argumentos))